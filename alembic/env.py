@@ -5,9 +5,8 @@ from sqlalchemy import pool
 
 from alembic import context
 
-from starsight.models import System, Spob
-from sqlalchemy.ext.declarative import declarative_base
-Base = declarative_base()
+import starsight.models  # noqa: F401 registers the tables on Base.metadata
+from starsight.database import Base
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -20,13 +20,13 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    with op.batch_alter_table('spobs') as batch_op:
+        batch_op.add_column(sa.Column('radius', sa.Float(), nullable=False, server_default='1'))
+
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    with op.batch_alter_table('spobs') as batch_op:
+        batch_op.drop_column('radius')
+
@@ -0,0 +1,38 @@
+"""spatial indexes
+
+Revision ID: 5e8b1f03d2a7
+Revises: c41d2e7f9a10
+Create Date: 2026-10-19 13:02:17.840551
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8b1f03d2a7'
+down_revision: Union[str, None] = 'c41d2e7f9a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_systems_galaxy_id_x_y', 'systems', ['galaxy_id', 'x', 'y'], unique=False, if_not_exists=True)
+    # all three are prefixes of, or superseded by, the composite index
+    op.drop_index('ix_systems_galaxy_id', table_name='systems', if_exists=True)
+    op.drop_index('ix_systems_x', table_name='systems', if_exists=True)
+    op.drop_index('ix_systems_y', table_name='systems', if_exists=True)
+    op.create_index('ix_hyperlink_destination_origin', 'hyperlink', ['destination', 'origin'], unique=False, if_not_exists=True)
+    op.execute('ANALYZE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_hyperlink_destination_origin', table_name='hyperlink')
+    op.create_index('ix_systems_y', 'systems', ['y'], unique=False)
+    op.create_index('ix_systems_x', 'systems', ['x'], unique=False)
+    op.create_index('ix_systems_galaxy_id', 'systems', ['galaxy_id'], unique=False)
+    op.drop_index('ix_systems_galaxy_id_x_y', table_name='systems')
@@ -20,13 +20,18 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.create_table(
+        'hyperlink',
+        sa.Column('origin', sa.BLOB(), nullable=False),
+        sa.Column('destination', sa.BLOB(), nullable=False),
+        sa.ForeignKeyConstraint(['destination'], ['systems.id']),
+        sa.ForeignKeyConstraint(['origin'], ['systems.id']),
+        sa.PrimaryKeyConstraint('origin', 'destination'),
+    )
+
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.drop_table('hyperlink')
+
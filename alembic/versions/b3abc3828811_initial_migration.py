@@ -20,13 +20,56 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.create_table(
+        'galaxies',
+        sa.Column('id', sa.BLOB(), nullable=False),
+        sa.Column('seed', sa.BLOB(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('id'),
+    )
+    op.create_table(
+        'systems',
+        sa.Column('id', sa.BLOB(), nullable=False),
+        sa.Column('galaxy_id', sa.BLOB(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('x', sa.Integer(), nullable=False),
+        sa.Column('y', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['galaxy_id'], ['galaxies.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('id'),
+    )
+    op.create_index('ix_systems_galaxy_id', 'systems', ['galaxy_id'], unique=False)
+    op.create_index('ix_systems_x', 'systems', ['x'], unique=False)
+    op.create_index('ix_systems_y', 'systems', ['y'], unique=False)
+    op.create_table(
+        'spobs',
+        sa.Column('id', sa.BLOB(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('type', sa.Enum('BARYCENTER', 'STAR', 'PLANET', 'MOON', name='spobtype', native_enum=False), nullable=False),
+        sa.Column('system_id', sa.BLOB(), nullable=False),
+        sa.Column('parent_id', sa.BLOB(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('mass', sa.Float(), nullable=False),
+        sa.Column('semi_major_axis', sa.Float(), nullable=False),
+        sa.Column('eccentricity', sa.Float(), nullable=False),
+        sa.Column('anomaly', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['parent_id'], ['spobs.id']),
+        sa.ForeignKeyConstraint(['system_id'], ['systems.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('id'),
+    )
+    op.create_index('ix_spobs_system_id', 'spobs', ['system_id'], unique=False)
+
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.drop_index('ix_spobs_system_id', table_name='spobs')
+    op.drop_table('spobs')
+    op.drop_index('ix_systems_y', table_name='systems')
+    op.drop_index('ix_systems_x', table_name='systems')
+    op.drop_index('ix_systems_galaxy_id', table_name='systems')
+    op.drop_table('systems')
+    op.drop_table('galaxies')
+
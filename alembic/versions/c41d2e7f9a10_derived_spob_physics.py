@@ -0,0 +1,39 @@
+"""derived spob physics
+
+Revision ID: c41d2e7f9a10
+Revises: 7503cc956eea
+Create Date: 2026-10-19 10:12:44.512093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d2e7f9a10'
+down_revision: Union[str, None] = '7503cc956eea'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('spobs') as batch_op:
+        batch_op.add_column(sa.Column('semi_minor_axis', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('roche_limit', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('hill_radius', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('period', sa.Float(), nullable=True))
+
+    from starsight.controllers.derivation import recompute_derived
+    recompute_derived(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('spobs') as batch_op:
+        batch_op.drop_column('period')
+        batch_op.drop_column('hill_radius')
+        batch_op.drop_column('roche_limit')
+        batch_op.drop_column('semi_minor_axis')
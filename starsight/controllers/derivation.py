@@ -0,0 +1,145 @@
+from typing import Iterable, Optional
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import aliased
+from starsight.models import Spob, guid_bytes
+import numpy as np
+
+GRAVITATIONAL_CONSTANT = 6.6743e-11
+ROCHE_FACTOR = 1.26
+
+DERIVED_COLUMNS = ('semi_minor_axis', 'roche_limit', 'hill_radius', 'period')
+
+
+def derive(
+    mass: np.ndarray,
+    parent_mass: np.ndarray,
+    has_parent: np.ndarray,
+    semi_major_axis: np.ndarray,
+    eccentricity: np.ndarray,
+    radius: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """
+    Vectorized orbital physics for a batch of spobs. Every argument is a float array
+    of the same length, except has_parent which is a bool array. Spobs without a parent
+    (or orbiting something massless) get a NaN period.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        semi_minor_axis = semi_major_axis * np.sqrt(1.0 - eccentricity ** 2)
+        roche_limit = radius * ROCHE_FACTOR
+        main_mass = np.where(has_parent, parent_mass, 0.0)
+        denominator = 3 * mass + main_mass
+        hill_radius = np.where(
+            denominator > 0,
+            semi_major_axis * np.cbrt(mass / denominator),
+            0.0,
+        )
+        orbits = has_parent & (parent_mass > 0)
+        period = np.where(
+            orbits,
+            2 * np.pi * np.sqrt(semi_major_axis ** 3 / (GRAVITATIONAL_CONSTANT * parent_mass)),
+            np.nan,
+        )
+    return {
+        'semi_minor_axis': semi_minor_axis,
+        'roche_limit': roche_limit,
+        'hill_radius': hill_radius,
+        'period': period,
+    }
+
+
+def _column(values: Iterable[Optional[float]]) -> np.ndarray:
+    return np.array([v or 0.0 for v in values], dtype=np.float64)
+
+
+def _to_python(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def _derive_columns(rows: list, parent_mass: np.ndarray, has_parent: np.ndarray) -> dict[str, np.ndarray]:
+    return derive(
+        _column(row.mass for row in rows),
+        parent_mass,
+        has_parent,
+        _column(row.semi_major_axis for row in rows),
+        _column(row.eccentricity for row in rows),
+        _column(row.radius for row in rows),
+    )
+
+
+def _derive_rows(rows: list) -> dict[str, np.ndarray]:
+    """
+    Parents are looked up by id within rows. Ids may be UUIDs, bytes or strings; rows
+    without an id yet (unflushed) can't be anyone's parent.
+    """
+    index = {}
+    for i, row in enumerate(rows):
+        key = guid_bytes(row.id)
+        if key is not None:
+            index[key] = i
+    mass = _column(row.mass for row in rows)
+    parent_idx = np.array([
+        index.get(key, -1) if (key := guid_bytes(row.parent_id)) is not None else -1
+        for row in rows
+    ], dtype=np.int64)
+    has_parent = parent_idx >= 0
+    parent_mass = np.where(has_parent, mass[parent_idx], 0.0)
+    return _derive_columns(rows, parent_mass, has_parent)
+
+
+def derive_spobs(spobs: list[Spob]) -> list[Spob]:
+    """
+    Generation time derivation stage. Fills the derived columns in place for a freshly
+    generated system. Parents are resolved through parent_id within the given list, so
+    nothing gets lazy loaded.
+    """
+    if not spobs:
+        return spobs
+    derived = _derive_rows(spobs)
+    for i, spob in enumerate(spobs):
+        for name in DERIVED_COLUMNS:
+            setattr(spob, name, _to_python(derived[name][i]))
+    return spobs
+
+
+def recompute_derived(conn, batch_size: int = 10000) -> int:
+    """
+    Recompute the derived columns for every spob in the database, e.g. after changing
+    one of the constants above. conn can be a Session or a Connection. Returns the
+    number of rows updated.
+
+    Rows are read batch_size at a time, keyset paginated on id, with the parent mass
+    joined in, so memory stays bounded and no cursor is left open across the updates.
+    """
+    spobs = Spob.__table__
+    parents = aliased(spobs)
+    query = select(
+        spobs.c.id,
+        spobs.c.mass,
+        spobs.c.semi_major_axis,
+        spobs.c.eccentricity,
+        spobs.c.radius,
+        parents.c.id.label('parent_id'),
+        parents.c.mass.label('parent_mass'),
+    ).outerjoin(parents, parents.c.id == spobs.c.parent_id).order_by(spobs.c.id).limit(batch_size)
+    statement = update(spobs).where(spobs.c.id == bindparam('b_id')).values(
+        **{name: bindparam(f'b_{name}') for name in DERIVED_COLUMNS}
+    )
+
+    count = 0
+    last_id = None
+    while True:
+        page = query if last_id is None else query.where(spobs.c.id > last_id)
+        rows = conn.execute(page).all()
+        if not rows:
+            return count
+        has_parent = np.array([row.parent_id is not None for row in rows], dtype=bool)
+        derived = _derive_columns(rows, _column(row.parent_mass for row in rows), has_parent)
+        conn.execute(statement, [
+            {
+                'b_id': row.id,
+                **{f'b_{name}': _to_python(derived[name][i]) for name in DERIVED_COLUMNS},
+            }
+            for i, row in enumerate(rows)
+        ])
+        count += len(rows)
+        last_id = rows[-1].id
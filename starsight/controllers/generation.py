@@ -1,10 +1,19 @@
 import random
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from dataclasses import dataclass
 import functools
-from typing import Optional
+import itertools
+import threading
+from typing import Optional, TYPE_CHECKING
+from starsight.grid import GridIndex, cells_in
+from starsight.controllers.simplex import get_noise_backend
+from starsight.instrumentation import Metrics, NULL_METRICS
 from starsight.models import Spob, SpobType, System, Galaxy
 import uuid
-import noise
+import numpy as np
+
+if TYPE_CHECKING:
+    from starsight.controllers.snapshot import StarfieldSnapshot
 
 SOLAR_MASS = 2 * 10**30
 SOLAR_RAD = 696340
@@ -21,6 +30,7 @@ GENERATION_PARAMS = {
     "star_threshold": 0.7,
     "max_jump_dist": 100,
     "jump_threshold": 0.5,
+    "noise_backend": "noise",  # see starsight.controllers.simplex.NOISE_BACKENDS
 
     "binary_chance": 0.333,
     "system_size_max_km": 150000000 * 75,
@@ -40,77 +50,224 @@ def system_designation(guid: str) -> str:
     return f'{letters}-{numbers}'
 
 
+CHUNK_SIZE = 500
+CHUNK_CACHE_SIZE = 1024
+
+
+@dataclass
+class Chunk:
+    index: GridIndex
+    systems: list[System]
+    # undirected, each pair sorted by id, at least one end inside the chunk
+    links: list[tuple[uuid.UUID, uuid.UUID]]
+
+    def to_json(self) -> dict:
+        return {
+            'chunk': list(self.index),
+            'systems': [
+                {'id': str(system.id), 'name': system.name, 'x': system.x, 'y': system.y}
+                for system in self.systems
+            ],
+            'links': [[str(origin), str(destination)] for origin, destination in self.links],
+        }
+
+
 class Starfield:
+    """
+    Chunked, cached view of a galaxy's star field. Chunks are GridIndex cells of
+    chunk_size. A chunk is generated together with a max_jump_dist margin so links
+    that cross into neighboring chunks come out the same whichever side generates them.
+
+    snapshot: chunks from a previous run, see starsight.controllers.snapshot. They are
+    read on a cache miss before falling back to generating.
+    """
 
-    def __init__(self, galaxy: Galaxy):
+    def __init__(
+        self,
+        galaxy: Galaxy,
+        chunk_size: int = CHUNK_SIZE,
+        cache_size: int = CHUNK_CACHE_SIZE,
+        snapshot: Optional['StarfieldSnapshot'] = None,
+    ):
+        if chunk_size % GENERATION_PARAMS['galaxy_cell_size']:
+            raise ValueError('chunk_size must be a multiple of galaxy_cell_size')
         self._galaxy: Galaxy = galaxy
-        self._cell_size = 20
-        self._star_threshold = 0.7
-        self._max_jump_dist = 100
-        self._jump_threshold = 0.5
+        self._chunk_size = chunk_size
+        self._cache_size = cache_size
+        self._snapshot = snapshot
+        self._chunks: OrderedDict[GridIndex, Chunk] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def galaxy(self) -> Galaxy:
+        return self._galaxy
+
+    @property
+    def chunk_size(self) -> int:
+        return self._chunk_size
 
-        self._snoise_base = self._galaxy.seed.int & 0xFFFFF
+    @property
+    def snapshot(self) -> Optional['StarfieldSnapshot']:
+        return self._snapshot
 
-        self._systems: dict[System] = {}
+    def chunks_in(self, window_x: int, window_y: int, width: int, height: int) -> list[GridIndex]:
+        return cells_in(window_x, window_y, width, height, self._chunk_size)
 
-    def generate_star_field(self) -> set[System]:
-        ...
+    def cached(self, index: GridIndex) -> Optional[Chunk]:
+        """
+        The chunk if it is cached or in the snapshot, without generating it.
+        """
+        with self._lock:
+            chunk = self._chunks.get(index)
+            if chunk is not None:
+                self._chunks.move_to_end(index)
+                return chunk
+        if self._snapshot is None:
+            return None
+        chunk = self._snapshot.chunk(index, self._galaxy)
+        if chunk is not None:
+            self._store(chunk)
+        return chunk
 
+    def chunk(self, index: GridIndex, metrics: Metrics = NULL_METRICS) -> Chunk:
+        chunk = self.cached(index)
+        if chunk is not None:
+            return chunk
+        chunk = self.generate_chunk(index, metrics)
+        self._store(chunk)
+        return chunk
 
-def generate_star_field(galaxy: Galaxy, window_x: int, window_y: int, width: int, height: int) -> list[System]:
+    def hottest(self, limit: int) -> list[Chunk]:
+        """
+        Cached chunks, most recently used first.
+        """
+        with self._lock:
+            return list(reversed(self._chunks.values()))[:limit]
+
+    def _store(self, chunk: Chunk):
+        with self._lock:
+            self._chunks[chunk.index] = chunk
+            self._chunks.move_to_end(chunk.index)
+            while len(self._chunks) > self._cache_size:
+                self._chunks.popitem(last=False)
+
+    def generate_chunk(self, index: GridIndex, metrics: Metrics = NULL_METRICS) -> Chunk:
+        margin = GENERATION_PARAMS['max_jump_dist']
+        min_x, min_y, max_x, max_y = index.bounds(self._chunk_size)
+        systems = generate_star_field(
+            self._galaxy,
+            min_x - margin,
+            min_y - margin,
+            max_x - min_x + 2 * margin,
+            max_y - min_y + 2 * margin,
+            metrics,
+        )
+        inside = [s for s in systems if s.bucket(self._chunk_size) == index]
+        inside_ids = {s.id for s in inside}
+        links = sorted({
+            (s1.id, s2.id) if s1.id < s2.id else (s2.id, s1.id)
+            for s1 in systems
+            for s2 in s1.hyperlinks
+            if s1.id in inside_ids or s2.id in inside_ids
+        })
+        return Chunk(index=index, systems=inside, links=links)
+
+
+def generate_star_field(
+    galaxy: Galaxy,
+    window_x: int,
+    window_y: int,
+    width: int,
+    height: int,
+    metrics: Metrics = NULL_METRICS,
+) -> list[System]:
     """
     window_x: x coord in cartesian plane
     window_y: y coord in cartesian plane
+    metrics: optional starsight.instrumentation.Metrics to collect per-stage timings
     """
     # TODO check for existing guys in the DB
-    systems = []
-    hyperlinks = []
+    with metrics.capture():
+        systems = _generate_star_field(galaxy, window_x, window_y, width, height, metrics)
+    metrics.report()
+    return systems
+
+
+def _generate_star_field(
+    galaxy: Galaxy,
+    window_x: int,
+    window_y: int,
+    width: int,
+    height: int,
+    metrics: Metrics,
+) -> list[System]:
     seed = galaxy.seed
     base = galaxy.snoise_base
+    backend = get_noise_backend(GENERATION_PARAMS['noise_backend'])
     buckets = {}
 
     step = GENERATION_PARAMS['galaxy_cell_size']
-    for x in range(window_x, window_x + width, step):
-        for y in range(window_y, window_y + height, step):
-            print(x, y)
-            value = (noise.snoise3(x, y, base, octaves=_OCTAVES) + 1.0) / 2.0
+    with metrics.stage('sample'):
+        grid_x, grid_y = np.meshgrid(
+            np.arange(window_x, window_x + width, step),
+            np.arange(window_y, window_y + height, step),
+            indexing='ij',
+        )
+        values = (backend.snoise3_array(grid_x, grid_y, base, _OCTAVES) + 1.0) / 2.0
+        accepted = values >= GENERATION_PARAMS['star_threshold']
+        cells = list(zip(grid_x[accepted].tolist(), grid_y[accepted].tolist()))
+    metrics.count('cells_sampled', grid_x.size)
+    metrics.count('stars_accepted', len(cells))
 
-            if value < GENERATION_PARAMS['star_threshold']:
-                continue
-            guid = uuid.uuid5(seed, f'{x},{y}')
-            # TODO bake in some semblance of what the stars will be like so it can be used for radius and color
-            system = System(
+    with metrics.stage('uuid'):
+        guids = [uuid.uuid5(seed, f'{x},{y}') for x, y in cells]
+
+    with metrics.stage('orm'):
+        # TODO bake in some semblance of what the stars will be like so it can be used for radius and color
+        systems = [
+            System(
                 id=guid,
                 galaxy_id=galaxy.id,
                 name=system_designation(str(guid)),
                 x=x,
                 y=y,
             )
-            systems.append(system)
+            for guid, (x, y) in zip(guids, cells)
+        ]
+
+    with metrics.stage('buckets'):
+        for system in systems:
             buckets.setdefault(system.bucket(GENERATION_PARAMS['max_jump_dist']), []).append(system)
-    print(len(systems))
-    print(len(buckets))
-
-    for coords, bucket in buckets.items():
-        brothers = bucket[:]
-        brothers.extend(buckets.get((coords[0]-1, coords[1]), []))
-        brothers.extend(buckets.get((coords[0]+1, coords[1]), []))
-        brothers.extend(buckets.get((coords[0]-1, coords[1]+1), []))
-        brothers.extend(buckets.get((coords[0], coords[1]+1), []))
-        brothers.extend(buckets.get((coords[0]+1, coords[1]+1), []))
-        brothers.extend(buckets.get((coords[0]-1, coords[1]-1), []))
-        brothers.extend(buckets.get((coords[0], coords[1]-1), []))
-        brothers.extend(buckets.get((coords[0]+1, coords[1]-1), []))
-        for i, s1 in enumerate(brothers):
-            for s2 in brothers[i:]:
-                if not s1.are_neighbors(s2, GENERATION_PARAMS['max_jump_dist']):
-                    continue
-                nx = (s1.x + s2.x) / 2
-                ny = (s1.y + s2.y) / 2
-                value = (noise.snoise3(nx, ny, base, octaves=_OCTAVES) + 1.0) / 2.0
-                if value < GENERATION_PARAMS['jump_threshold']:
-                    continue
-                s1.hyperlinks.append(s2)
+    metrics.count('buckets', len(buckets))
 
+    pairs_tested = 0
+    links_accepted = 0
+    with metrics.stage('links'):
+        pairs = []
+        # each bucket against itself and its half neighborhood, so every pair of
+        # systems is tested once
+        for coords, members in buckets.items():
+            others = []
+            for neighbor in coords.half_neighborhood():
+                others.extend(buckets.get(neighbor, ()))
+            pairs_tested += len(members) * (len(members) - 1) // 2 + len(members) * len(others)
+            for i, s1 in enumerate(members):
+                for s2 in itertools.chain(members[i + 1:], others):
+                    if s1.are_neighbors(s2, GENERATION_PARAMS['max_jump_dist']):
+                        pairs.append((s1, s2))
+        # midpoint noise for every candidate pair in one call
+        values = (backend.snoise3_array(
+            np.array([(s1.x + s2.x) / 2 for s1, s2 in pairs]),
+            np.array([(s1.y + s2.y) / 2 for s1, s2 in pairs]),
+            base,
+            _OCTAVES,
+        ) + 1.0) / 2.0
+        for (s1, s2), value in zip(pairs, values.tolist()):
+            if value < GENERATION_PARAMS['jump_threshold']:
+                continue
+            s1.hyperlinks.append(s2)
+            links_accepted += 1
+    metrics.count('pairs_tested', pairs_tested)
+    metrics.count('links_accepted', links_accepted)
 
     return systems
@@ -0,0 +1,393 @@
+"""
+Background chunk generation.
+
+ChunkScheduler owns a priority queue of (galaxy, chunk) jobs and a bounded pool of
+worker threads. Callers get a concurrent.futures.Future per chunk and a chunk that is
+already queued or running hands out the same future, so concurrent requests share one
+computation. Jobs are ordered by
+
+    (band, -request, distance)
+
+band: VISIBLE for chunks a client is looking at, PREFETCH for speculative work around
+it. Only prefetch_workers workers take prefetch jobs, the rest are kept for visible ones.
+request: newer requests first, a client that has panned away does not hold back the
+viewport it is looking at now.
+distance: position in the request, nearest to the viewport center first.
+
+Visible requests are made on behalf of an owner, e.g. one WebSocket connection. Each
+request replaces the owner's previous one: queued visible jobs it no longer asks for,
+and that no other owner wants, are cancelled, as are all of them on release(owner).
+An owner has at most max_visible queued jobs at a time. Jobs that are already running
+always finish and land in the Starfield cache.
+
+Asking for a queued chunk again moves it up if the new priority is better. Prefetch
+jobs beyond max_prefetch are dropped, oldest first, and their futures cancelled.
+"""
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Collection, Hashable, Iterable, Optional
+import heapq
+import itertools
+import threading
+import time
+import uuid
+
+from starsight.controllers.generation import Chunk, Starfield
+from starsight.grid import GridIndex
+
+VISIBLE = 0
+PREFETCH = 1
+
+WORKERS = 4
+PREFETCH_WORKERS = 2
+MAX_VISIBLE = 64
+MAX_PREFETCH = 256
+LATENCY_SAMPLES = 1024
+
+Priority = tuple[int, int, int]
+Key = tuple[uuid.UUID, GridIndex]
+
+
+@dataclass
+class _Job:
+    starfield: Starfield
+    index: GridIndex
+    priority: Priority
+    future: Future = field(default_factory=Future)
+    queued_at: float = field(default_factory=time.perf_counter)
+    # bumped when the job is reprioritized, heap entries with an older one are stale
+    version: int = 0
+    owners: set = field(default_factory=set)
+
+    @property
+    def key(self) -> Key:
+        return self.starfield.galaxy.id, self.index
+
+
+def _done(chunk: Chunk) -> Future:
+    future = Future()
+    future.set_result(chunk)
+    return future
+
+
+def _percentiles(samples: Iterable[float]) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {'p50': None, 'p95': None, 'max': None}
+    return {
+        'p50': ordered[len(ordered) // 2],
+        'p95': ordered[int(len(ordered) * 0.95)],
+        'max': ordered[-1],
+    }
+
+
+def ring(starfield: Starfield, window: tuple[int, int, int, int], width: int = 1, limit: int = MAX_PREFETCH) -> list[GridIndex]:
+    """
+    Chunks in a band width chunks wide around the chunks covering window, nearest to
+    the window center first, at most limit of them. Along each side only the limit
+    cells nearest its middle can make the cut, so at most about 4 * width * 2 * limit
+    cells are looked at however large the window is.
+    """
+    x, y, w, h = window
+    size = starfield.chunk_size
+    low = GridIndex.of(x, y, size)
+    high = GridIndex.of(x + max(w, 1) - 1, y + max(h, 1) - 1, size)
+    center_x = (x + w / 2) / size - 0.5
+    center_y = (y + h / 2) / size - 0.5
+    mid_x, mid_y = int(center_x), int(center_y)
+    columns = range(max(low.x - width, mid_x - limit), min(high.x + width, mid_x + limit) + 1)
+    rows = range(max(low.y, mid_y - limit), min(high.y, mid_y + limit) + 1)
+    cells = []
+    for dy in range(1, width + 1):
+        # above and below, corners included
+        cells.extend(GridIndex(cx, low.y - dy) for cx in columns)
+        cells.extend(GridIndex(cx, high.y + dy) for cx in columns)
+    for dx in range(1, width + 1):
+        cells.extend(GridIndex(low.x - dx, cy) for cy in rows)
+        cells.extend(GridIndex(high.x + dx, cy) for cy in rows)
+    cells.sort(key=lambda index: (index.x - center_x) ** 2 + (index.y - center_y) ** 2)
+    return cells[:limit]
+
+
+class ChunkScheduler:
+
+    def __init__(
+        self,
+        workers: int = WORKERS,
+        prefetch_workers: int = PREFETCH_WORKERS,
+        max_visible: int = MAX_VISIBLE,
+        max_prefetch: int = MAX_PREFETCH,
+    ):
+        if not 0 <= prefetch_workers <= workers:
+            raise ValueError('prefetch_workers must be between 0 and workers')
+        self._workers = workers
+        self._prefetch_workers = prefetch_workers
+        self._max_visible = max_visible
+        self._max_prefetch = max_prefetch
+        self._heap: list[tuple[Priority, int, int, _Job]] = []
+        self._jobs: dict[Key, _Job] = {}
+        self._running: dict[Key, _Job] = {}
+        self._owned: dict[Hashable, set[Key]] = {}
+        self._running_prefetch = 0
+        self._queued_prefetch = 0
+        self._requests = itertools.count()
+        self._entries = itertools.count()
+        self._condition = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._closed = False
+
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._dropped = 0
+        self._deduplicated = 0
+        self._wait_samples: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._run_samples: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def request(
+        self,
+        starfield: Starfield,
+        indexes: Iterable[GridIndex],
+        band: int = VISIBLE,
+        owner: Optional[Hashable] = None,
+    ) -> list[Future]:
+        """
+        Futures for indexes in order, which is also their priority within the request.
+        Chunks that are cached come back already resolved.
+
+        owner: for visible requests, replaces the owner's previous request. Without
+        one the jobs are never cancelled on anyone's behalf.
+        """
+        indexes = list(indexes)
+        if owner is not None and len(indexes) > self._max_visible:
+            raise ValueError(f'at most {self._max_visible} visible chunks per owner')
+        # may decode snapshot chunks, kept out of the lock
+        cached = {index: chunk for index in indexes if (chunk := starfield.cached(index)) is not None}
+
+        futures = []
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('scheduler is shut down')
+            request = next(self._requests)
+            keys = set()
+            for distance, index in enumerate(indexes):
+                chunk = cached.get(index)
+                if chunk is not None:
+                    futures.append(_done(chunk))
+                    continue
+                futures.append(self._submit(starfield, index, (band, -request, distance), owner))
+                keys.add((starfield.galaxy.id, index))
+            if owner is not None:
+                self._release(owner, keep=keys)
+                if keys:
+                    self._owned[owner] = keys
+            self._trim_prefetch()
+            self._compact()
+            self._start_workers()
+            self._condition.notify_all()
+        return futures
+
+    def prefetch(self, starfield: Starfield, window: tuple[int, int, int, int], width: int = 1) -> list[Future]:
+        """
+        Queue the ring of chunks around window, nearest first. See ring().
+        """
+        return self.request(starfield, ring(starfield, window, width, self._max_prefetch), band=PREFETCH)
+
+    def release(self, owner: Hashable):
+        """
+        Cancel the owner's queued visible jobs that nobody else is waiting on.
+        """
+        with self._condition:
+            self._release(owner)
+
+    def _release(self, owner: Hashable, keep: Collection[Key] = ()):
+        for key in self._owned.pop(owner, ()):
+            if key in keep:
+                continue
+            job = self._jobs.get(key)
+            if job is None:
+                # running or done already
+                continue
+            job.owners.discard(owner)
+            if not job.owners and job.priority[0] == VISIBLE:
+                del self._jobs[key]
+                job.future.cancel()
+                self._cancelled += 1
+        # cancelled jobs are skipped when they come off the heap
+
+    def _submit(self, starfield: Starfield, index: GridIndex, priority: Priority, owner: Optional[Hashable]) -> Future:
+        key = (starfield.galaxy.id, index)
+        running = self._running.get(key)
+        if running is not None:
+            self._deduplicated += 1
+            return running.future
+        job = self._jobs.get(key)
+        if job is not None:
+            self._deduplicated += 1
+            if priority < job.priority:
+                if job.priority[0] == PREFETCH and priority[0] == VISIBLE:
+                    self._queued_prefetch -= 1
+                job.priority = priority
+                job.version += 1
+                heapq.heappush(self._heap, (priority, next(self._entries), job.version, job))
+        else:
+            job = _Job(starfield, index, priority)
+            self._jobs[key] = job
+            if priority[0] == PREFETCH:
+                self._queued_prefetch += 1
+            heapq.heappush(self._heap, (priority, next(self._entries), job.version, job))
+        if priority[0] == VISIBLE:
+            job.owners.add(owner)
+        return job.future
+
+    def _trim_prefetch(self):
+        if self._queued_prefetch <= self._max_prefetch:
+            return
+        prefetch = sorted(
+            (job for job in self._jobs.values() if job.priority[0] == PREFETCH),
+            key=lambda job: job.priority,
+        )
+        for job in prefetch[self._max_prefetch:]:
+            del self._jobs[job.key]
+            job.future.cancel()
+            self._queued_prefetch -= 1
+            self._dropped += 1
+
+    def _compact(self):
+        """
+        Drop stale heap entries once they outnumber the live ones, the heap would
+        otherwise grow with every cancelled or reprioritized job.
+        """
+        if len(self._heap) <= 2 * len(self._jobs) + 64:
+            return
+        self._heap = [
+            entry for entry in self._heap
+            if self._jobs.get(entry[3].key) is entry[3] and entry[2] == entry[3].version
+        ]
+        heapq.heapify(self._heap)
+
+    def _start_workers(self):
+        while len(self._threads) < self._workers:
+            thread = threading.Thread(target=self._work, name=f'chunk-worker-{len(self._threads)}', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self) -> Optional[_Job]:
+        """
+        Pop the best runnable job, called with the lock held. Prefetch jobs wait while
+        prefetch_workers of them are already running.
+        """
+        while self._heap:
+            priority, _, version, job = self._heap[0]
+            if self._jobs.get(job.key) is not job or version != job.version:
+                heapq.heappop(self._heap)
+                continue
+            if priority[0] == PREFETCH and self._running_prefetch >= self._prefetch_workers:
+                # the heap is ordered by band, everything left is prefetch too
+                return None
+            heapq.heappop(self._heap)
+            return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None and not self._closed:
+                    self._condition.wait()
+                    job = self._next_job()
+                if job is None:
+                    return
+                del self._jobs[job.key]
+                prefetch = job.priority[0] == PREFETCH
+                if prefetch:
+                    self._queued_prefetch -= 1
+                    self._running_prefetch += 1
+                self._running[job.key] = job
+                started = time.perf_counter()
+                self._wait_samples.append(started - job.queued_at)
+
+            outcome = 'cancelled'
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.starfield.chunk(job.index))
+                    outcome = 'completed'
+                except Exception as e:
+                    job.future.set_exception(e)
+                    outcome = 'failed'
+
+            with self._condition:
+                del self._running[job.key]
+                if prefetch:
+                    self._running_prefetch -= 1
+                if outcome == 'cancelled':
+                    self._cancelled += 1
+                else:
+                    self._run_samples.append(time.perf_counter() - started)
+                if outcome == 'completed':
+                    self._completed += 1
+                elif outcome == 'failed':
+                    self._failed += 1
+                # a prefetch slot may have opened up
+                self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            queued = len(self._jobs)
+            return {
+                'workers': self._workers,
+                'prefetch_workers': self._prefetch_workers,
+                'owners': len(self._owned),
+                'queued': queued,
+                'queued_visible': queued - self._queued_prefetch,
+                'queued_prefetch': self._queued_prefetch,
+                'running': len(self._running),
+                'running_prefetch': self._running_prefetch,
+                'completed': self._completed,
+                'failed': self._failed,
+                'cancelled': self._cancelled,
+                'dropped': self._dropped,
+                'deduplicated': self._deduplicated,
+                'wait_seconds': _percentiles(self._wait_samples),
+                'run_seconds': _percentiles(self._run_samples),
+            }
+
+    def shutdown(self, wait: bool = True):
+        """
+        Cancel queued jobs and stop the workers once the running ones finish.
+        """
+        with self._condition:
+            self._closed = True
+            for job in self._jobs.values():
+                job.future.cancel()
+            self._jobs.clear()
+            self._owned.clear()
+            self._heap.clear()
+            self._queued_prefetch = 0
+            self._condition.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+_scheduler: Optional[ChunkScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ChunkScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ChunkScheduler()
+    return _scheduler
+
+
+def shutdown_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.shutdown()
@@ -0,0 +1,229 @@
+"""
+Pluggable noise backends for generation.
+
+NoiseModuleBackend calls noise.snoise3 point by point, the way generation always has.
+NumpySimplexBackend is an array-at-a-time port of the same simplex kernel
+(noise 1.2.2, _simplex.c). It does the arithmetic in float32 in the same order as
+the C code, so its output is identical to noise.snoise3, and it evaluates whole
+rows of a grid per call. Numpy releases the GIL inside its loops, so row blocks
+are spread across a thread pool.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Protocol
+import os
+import threading
+
+import numpy as np
+
+F3 = np.float32(1.0) / np.float32(3.0)
+G3 = np.float32(1.0) / np.float32(6.0)
+G3_2 = np.float32(2.0) * G3
+G3_3 = np.float32(3.0) * G3
+ONE = np.float32(1.0)
+RADIUS = np.float32(0.6)
+SCALE = np.float32(32.0)
+
+GRAD3 = np.array([
+    [1, 1, 0], [-1, 1, 0], [1, -1, 0], [-1, -1, 0],
+    [1, 0, 1], [-1, 0, 1], [1, 0, -1], [-1, 0, -1],
+    [0, 1, 1], [0, -1, 1], [0, 1, -1], [0, -1, -1],
+], dtype=np.float32)
+# gradient components indexed by PERM value directly, saves the % 12
+_GX, _GY, _GZ = (np.ascontiguousarray(GRAD3[np.arange(256) % 12, c]) for c in range(3))
+
+PERM = np.tile(np.array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140, 36, 103,
+    30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247, 120, 234, 75, 0, 26, 197,
+    62, 94, 252, 219, 203, 117, 35, 11, 32, 57, 177, 33, 88, 237, 149, 56, 87, 174, 20,
+    125, 136, 171, 168, 68, 175, 74, 165, 71, 134, 139, 48, 27, 166, 77, 146, 158, 231,
+    83, 111, 229, 122, 60, 211, 133, 230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102,
+    143, 54, 65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169, 200,
+    196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226,
+    250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206, 59, 227, 47,
+    16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44, 154, 163,
+    70, 221, 153, 101, 155, 167, 43, 172, 9, 129, 22, 39, 253, 19, 98, 108, 110, 79,
+    113, 224, 232, 178, 185, 112, 104, 218, 246, 97, 228, 251, 34, 242, 193, 238, 210,
+    144, 12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14, 239, 107, 49, 192, 214, 31,
+    181, 199, 106, 157, 184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150, 254, 138, 236,
+    205, 93, 222, 114, 67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180
+], dtype=np.int32), 2)
+
+# simplex traversal order, indexed by (x0 >= y0) << 2 | (y0 >= z0) << 1 | (x0 >= z0)
+# following the branches in _simplex.c noise3
+_O1 = np.array([
+    [0, 0, 1], [0, 0, 1], [0, 1, 0], [0, 1, 0],
+    [0, 0, 1], [1, 0, 0], [1, 0, 0], [1, 0, 0],
+], dtype=np.int32)
+_O2 = np.array([
+    [0, 1, 1], [0, 1, 1], [0, 1, 1], [1, 1, 0],
+    [1, 0, 1], [1, 0, 1], [1, 1, 0], [1, 1, 0],
+], dtype=np.int32)
+_O1F = _O1.astype(np.float32)
+_O2F = _O2.astype(np.float32)
+
+# points per call to fbm_noise3, small enough for the temporaries to stay in cache
+BLOCK_SIZE = 4096
+
+
+class NoiseBackend(Protocol):
+    name: str
+
+    def snoise3(self, x: float, y: float, z: float, octaves: int = 1) -> float:
+        ...
+
+    def snoise3_array(self, x: np.ndarray, y: np.ndarray, z: float, octaves: int = 1) -> np.ndarray:
+        ...
+
+
+class NoiseModuleBackend:
+    name = 'noise'
+
+    def __init__(self):
+        import noise
+        self._snoise3 = noise.snoise3
+
+    def snoise3(self, x: float, y: float, z: float, octaves: int = 1) -> float:
+        return self._snoise3(x, y, z, octaves=octaves)
+
+    def snoise3_array(self, x: np.ndarray, y: np.ndarray, z: float, octaves: int = 1) -> np.ndarray:
+        snoise3 = self._snoise3
+        x, y = np.broadcast_arrays(x, y)
+        return np.fromiter(
+            (snoise3(a, b, z, octaves=octaves) for a, b in zip(x.ravel().tolist(), y.ravel().tolist())),
+            dtype=np.float64,
+            count=x.size,
+        ).reshape(x.shape)
+
+
+def _corner(x: np.ndarray, y: np.ndarray, z: np.ndarray, g: np.ndarray) -> np.ndarray:
+    # f * f * f * f * dot3(pos, GRAD3[g]), 0 outside the kernel radius
+    f = RADIUS - x * x
+    f -= y * y
+    f -= z * z
+    np.maximum(f, np.float32(0.0), out=f)
+    dot = x * _GX[g]
+    dot += y * _GY[g]
+    dot += z * _GZ[g]
+    f4 = f * f
+    f4 *= f
+    f4 *= f
+    f4 *= dot
+    return f4
+
+
+def _noise3(x: np.ndarray, y: np.ndarray, z: np.float32) -> np.ndarray:
+    s = (x + y + z) * F3
+    i = np.floor(x + s)
+    j = np.floor(y + s)
+    k = np.floor(z + s)
+    t = (i + j + k) * G3
+    x0 = x - (i - t)
+    y0 = y - (j - t)
+    z0 = z - (k - t)
+
+    case = (x0 >= y0).view(np.uint8) << 2
+    case |= (y0 >= z0).view(np.uint8) << 1
+    case |= (x0 >= z0).view(np.uint8)
+    o1 = _O1[case]
+    o2 = _O2[case]
+    o1f = _O1F[case]
+    o2f = _O2F[case]
+
+    I = i.astype(np.int32) & 255
+    J = j.astype(np.int32) & 255
+    K = k.astype(np.int32) & 255
+    g0 = PERM[I + PERM[J + PERM[K]]]
+    g1 = PERM[I + o1[:, 0] + PERM[J + o1[:, 1] + PERM[K + o1[:, 2]]]]
+    g2 = PERM[I + o2[:, 0] + PERM[J + o2[:, 1] + PERM[K + o2[:, 2]]]]
+    g3 = PERM[I + 1 + PERM[J + 1 + PERM[K + 1]]]
+
+    total = _corner(x0, y0, z0, g0)
+    total += _corner(x0 - o1f[:, 0] + G3, y0 - o1f[:, 1] + G3, z0 - o1f[:, 2] + G3, g1)
+    total += _corner(x0 - o2f[:, 0] + G3_2, y0 - o2f[:, 1] + G3_2, z0 - o2f[:, 2] + G3_2, g2)
+    total += _corner(x0 - ONE + G3_3, y0 - ONE + G3_3, z0 - ONE + G3_3, g3)
+    total *= SCALE
+    return total
+
+
+def fbm_noise3(
+    x: np.ndarray,
+    y: np.ndarray,
+    z: float,
+    octaves: int = 1,
+    persistence: float = 0.5,
+    lacunarity: float = 2.0,
+) -> np.ndarray:
+    """
+    noise.snoise3 over flat arrays of x and y at a single z. Returns float64 like
+    snoise3 does, but the values are float32 precision.
+    """
+    if octaves < 1:
+        raise ValueError('Expected octaves value > 0')
+    x = np.asarray(x, dtype=np.float32).ravel()
+    y = np.asarray(y, dtype=np.float32).ravel()
+    z = np.float32(z)
+    persistence = np.float32(persistence)
+    lacunarity = np.float32(lacunarity)
+
+    freq = np.float32(1.0)
+    amp = np.float32(1.0)
+    total_amp = np.float32(1.0)
+    total = _noise3(x, y, z)
+    for _ in range(1, octaves):
+        freq = freq * lacunarity
+        amp = amp * persistence
+        total_amp = total_amp + amp
+        total = total + _noise3(x * freq, y * freq, z * freq) * amp
+    return (total / total_amp).astype(np.float64)
+
+
+class NumpySimplexBackend:
+    name = 'numpy'
+
+    def __init__(self, workers: Optional[int] = None, block: int = BLOCK_SIZE):
+        self._workers = workers if workers is not None else min(8, os.cpu_count() or 1)
+        self._block = block
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def snoise3(self, x: float, y: float, z: float, octaves: int = 1) -> float:
+        return float(fbm_noise3(np.array([x]), np.array([y]), z, octaves)[0])
+
+    def snoise3_array(self, x: np.ndarray, y: np.ndarray, z: float, octaves: int = 1) -> np.ndarray:
+        x, y = np.broadcast_arrays(np.asarray(x), np.asarray(y))
+        shape = x.shape
+        if not x.size:
+            return np.zeros(shape)
+        x = x.ravel()
+        y = y.ravel()
+        block = self._block
+
+        def run(start: int) -> np.ndarray:
+            return fbm_noise3(x[start:start + block], y[start:start + block], z, octaves)
+        starts = range(0, x.size, block)
+        if self._workers <= 1 or len(starts) <= 1:
+            parts = map(run, starts)
+        else:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self._workers, thread_name_prefix='simplex')
+            parts = self._pool.map(run, starts)
+        return np.concatenate(list(parts)).reshape(shape)
+
+
+NOISE_BACKENDS = {
+    NoiseModuleBackend.name: NoiseModuleBackend,
+    NumpySimplexBackend.name: NumpySimplexBackend,
+}
+
+_backends: dict[str, NoiseBackend] = {}
+
+
+def get_noise_backend(name: str) -> NoiseBackend:
+    backend = _backends.get(name)
+    if backend is None:
+        try:
+            backend = _backends[name] = NOISE_BACKENDS[name]()
+        except KeyError:
+            raise ValueError(f'unknown noise backend {name!r}, expected one of {sorted(NOISE_BACKENDS)}') from None
+    return backend
@@ -0,0 +1,269 @@
+"""
+Warm-start snapshots of Starfield chunk caches.
+
+On shutdown the hottest chunks of every Starfield are written to the snapshot
+directory as plain .npy arrays, and on start they are memory-mapped back, so a fresh
+worker serves recently visited regions without regenerating them. Only the chunk
+table is read eagerly, systems and links are paged in as chunks are asked for.
+
+Per galaxy:
+
+    <galaxy id>.json                  galaxy, chunk size, generation fingerprint, token
+    <galaxy id>-<token>.chunks.npy    chunk x, y and end offsets into systems and links, hottest first
+    <galaxy id>-<token>.systems.npy   id, x, y
+    <galaxy id>-<token>.links.npy     sorted id pairs
+
+The json is replaced last, atomically, so a concurrent reader sees either the old or
+the new snapshot. Writers hold <galaxy id>.lock and merge with whatever is on disk, so
+workers sharing the directory don't drop each other's chunks. Snapshots taken with different generation params are ignored.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+import fcntl
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+
+from starsight.controllers.generation import (
+    CHUNK_CACHE_SIZE, GENERATION_PARAMS, Chunk, Starfield, system_designation,
+)
+from starsight.grid import GridIndex
+from starsight.models import Galaxy, System, uuid_from_bytes
+
+# 2: chunks no longer carry self links
+FORMAT_VERSION = 2
+SNAPSHOT_DIR: Optional[str] = os.environ.get('STARSIGHT_SNAPSHOT_DIR', 'data/snapshots') or None
+SNAPSHOT_CHUNKS = CHUNK_CACHE_SIZE
+
+CHUNK_DTYPE = np.dtype([('x', '<i8'), ('y', '<i8'), ('systems', '<i8'), ('links', '<i8')])
+SYSTEM_DTYPE = np.dtype([('id', 'V16'), ('x', '<i8'), ('y', '<i8')])
+LINK_DTYPE = np.dtype([('first', 'V16'), ('second', 'V16')])
+
+_ARRAYS = ('chunks', 'systems', 'links')
+
+
+def generation_fingerprint() -> str:
+    """
+    Changes whenever GENERATION_PARAMS would generate different chunks. The noise
+    backends are interchangeable so the backend choice is left out.
+    """
+    params = sorted((k, v) for k, v in GENERATION_PARAMS.items() if k != 'noise_backend')
+    return hashlib.sha1(repr(params).encode()).hexdigest()
+
+
+def _guids(values: np.ndarray) -> list[uuid.UUID]:
+    blob = values.tobytes()
+    return [uuid_from_bytes(blob[i:i + 16]) for i in range(0, len(blob), 16)]
+
+
+class StarfieldSnapshot:
+    """
+    Memory-mapped chunks of one galaxy, hottest first.
+    """
+
+    def __init__(self, chunks: np.ndarray, systems: np.ndarray, links: np.ndarray):
+        self._chunks = chunks
+        self._systems = systems
+        self._links = links
+        self._rows = {
+            GridIndex(x, y): row
+            for row, (x, y) in enumerate(zip(chunks['x'].tolist(), chunks['y'].tolist()))
+        }
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, index: GridIndex) -> bool:
+        return index in self._rows
+
+    def indexes(self) -> list[GridIndex]:
+        return list(self._rows)
+
+    def _slices(self, row: int) -> tuple[slice, slice]:
+        systems_end = int(self._chunks['systems'][row])
+        links_end = int(self._chunks['links'][row])
+        systems_start = int(self._chunks['systems'][row - 1]) if row else 0
+        links_start = int(self._chunks['links'][row - 1]) if row else 0
+        return slice(systems_start, systems_end), slice(links_start, links_end)
+
+    def raw(self, index: GridIndex) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The chunk's systems and links rows without building a Chunk.
+        """
+        systems, links = self._slices(self._rows[index])
+        return self._systems[systems], self._links[links]
+
+    def chunk(self, index: GridIndex, galaxy: Galaxy) -> Optional[Chunk]:
+        if index not in self._rows:
+            return None
+        systems, links = self.raw(index)
+        ids = _guids(systems['id'])
+        return Chunk(
+            index=index,
+            systems=[
+                System(id=guid, galaxy_id=galaxy.id, name=system_designation(str(guid)), x=x, y=y)
+                for guid, x, y in zip(ids, systems['x'].tolist(), systems['y'].tolist())
+            ],
+            links=list(zip(_guids(links['first']), _guids(links['second']))),
+        )
+
+
+def _encode(chunk: Chunk) -> tuple[np.ndarray, np.ndarray]:
+    systems = np.empty(len(chunk.systems), dtype=SYSTEM_DTYPE)
+    systems['id'] = np.frombuffer(b''.join(s.id.bytes for s in chunk.systems), dtype='V16')
+    systems['x'] = [s.x for s in chunk.systems]
+    systems['y'] = [s.y for s in chunk.systems]
+    links = np.empty(len(chunk.links), dtype=LINK_DTYPE)
+    links['first'] = np.frombuffer(b''.join(first.bytes for first, _ in chunk.links), dtype='V16')
+    links['second'] = np.frombuffer(b''.join(second.bytes for _, second in chunk.links), dtype='V16')
+    return systems, links
+
+
+def _paths(directory: Path, galaxy_id: uuid.UUID, token: str) -> dict[str, Path]:
+    return {name: directory / f'{galaxy_id}-{token}.{name}.npy' for name in _ARRAYS}
+
+
+def _load_array(path: Path) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode='r', allow_pickle=False)
+    except ValueError:
+        # empty arrays can't be mapped
+        return np.load(path, allow_pickle=False)
+
+
+def _read_meta(directory: Path, galaxy_id: uuid.UUID) -> Optional[dict]:
+    try:
+        return json.loads((directory / f'{galaxy_id}.json').read_text())
+    except FileNotFoundError:
+        return None
+
+
+def _open(directory: Path, galaxy_id: uuid.UUID) -> Optional[tuple[dict, StarfieldSnapshot]]:
+    meta = _read_meta(directory, galaxy_id)
+    if meta is None or meta.get('format') != FORMAT_VERSION or meta.get('generation') != generation_fingerprint():
+        return None
+    try:
+        arrays = {
+            name: _load_array(path)
+            for name, path in _paths(directory, galaxy_id, meta['token']).items()
+        }
+    except FileNotFoundError:
+        return None
+    return meta, StarfieldSnapshot(**arrays)
+
+
+@contextmanager
+def _locked(directory: Path, galaxy_id: uuid.UUID):
+    """
+    Exclusive lock on the galaxy's snapshot, held across a whole dump so workers
+    sharing the directory take turns.
+    """
+    with open(directory / f'{galaxy_id}.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def dump_starfield(starfield: Starfield, directory: str, limit: int = SNAPSHOT_CHUNKS) -> int:
+    """
+    Write the hottest chunks of starfield, topped up with the chunks of the snapshot
+    currently on disk (which may have been written by another worker since this one
+    started) and then of the one starfield was loaded from. Returns the number of
+    chunks written.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    galaxy = starfield.galaxy
+
+    with _locked(directory, galaxy.id):
+        pieces = []
+        indexes: list[GridIndex] = []
+        for chunk in starfield.hottest(limit):
+            indexes.append(chunk.index)
+            pieces.append(_encode(chunk))
+        written = set(indexes)
+        current = _open(directory, galaxy.id)
+        sources = []
+        if current is not None and current[0]['chunk_size'] == starfield.chunk_size:
+            sources.append(current[1])
+        if starfield.snapshot is not None:
+            sources.append(starfield.snapshot)
+        for source in sources:
+            for index in source.indexes():
+                if len(indexes) >= limit:
+                    break
+                if index not in written:
+                    written.add(index)
+                    indexes.append(index)
+                    pieces.append(source.raw(index))
+        if not indexes:
+            return 0
+
+        chunks = np.empty(len(indexes), dtype=CHUNK_DTYPE)
+        chunks['x'] = [index.x for index in indexes]
+        chunks['y'] = [index.y for index in indexes]
+        chunks['systems'] = np.cumsum([len(systems) for systems, _ in pieces], dtype=np.int64)
+        chunks['links'] = np.cumsum([len(links) for _, links in pieces], dtype=np.int64)
+        arrays = {
+            'chunks': chunks,
+            'systems': np.concatenate([systems for systems, _ in pieces]),
+            'links': np.concatenate([links for _, links in pieces]),
+        }
+
+        token = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        for name, path in _paths(directory, galaxy.id, token).items():
+            np.save(path, arrays[name], allow_pickle=False)
+        meta = {
+            'format': FORMAT_VERSION,
+            'galaxy': {'id': galaxy.id.hex, 'seed': galaxy.seed.hex, 'name': galaxy.name},
+            'chunk_size': starfield.chunk_size,
+            'generation': generation_fingerprint(),
+            'token': token,
+        }
+        tmp = directory / f'{galaxy.id}.json.{token}'
+        tmp.write_text(json.dumps(meta, indent=2))
+        os.replace(tmp, directory / f'{galaxy.id}.json')
+
+        # everything but the new snapshot, including leftovers of dumps that died
+        # halfway. Readers that still have old arrays mapped keep working, the data
+        # lives until they unmap.
+        keep = set(_paths(directory, galaxy.id, token).values())
+        for path in [*directory.glob(f'{galaxy.id}-*.npy'), *directory.glob(f'{galaxy.id}.json.*')]:
+            if path not in keep:
+                path.unlink(missing_ok=True)
+    return len(indexes)
+
+
+def load_starfield(directory: str, galaxy_id: uuid.UUID) -> Optional[Starfield]:
+    """
+    A Starfield backed by the galaxy's snapshot, or None if there is no usable one.
+    """
+    opened = _open(Path(directory), galaxy_id)
+    if opened is None:
+        return None
+    meta, snapshot = opened
+    info = meta['galaxy']
+    galaxy = Galaxy(id=uuid.UUID(info['id']), seed=uuid.UUID(info['seed']), name=info['name'])
+    return Starfield(galaxy, chunk_size=meta['chunk_size'], snapshot=snapshot)
+
+
+def load_starfields(directory: str) -> list[Starfield]:
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    starfields = []
+    for path in sorted(directory.glob('*.json')):
+        try:
+            galaxy_id = uuid.UUID(path.stem)
+        except ValueError:
+            continue
+        starfield = load_starfield(directory, galaxy_id)
+        if starfield is not None:
+            starfields.append(starfield)
+    return starfields
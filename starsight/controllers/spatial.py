@@ -0,0 +1,31 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starsight.models import System, hyperlink
+import uuid
+
+
+def viewport_query(galaxy_id: uuid.UUID, window_x: int, window_y: int, width: int, height: int):
+    """
+    Systems inside the window, min inclusive and max exclusive. Served by the
+    (galaxy_id, x, y) index: equality on galaxy_id, a range seek on x and y filtered
+    from the index itself.
+    """
+    return select(System).where(
+        System.galaxy_id == galaxy_id,
+        System.x >= window_x,
+        System.x < window_x + width,
+        System.y >= window_y,
+        System.y < window_y + height,
+    )
+
+
+def systems_in_viewport(db: Session, galaxy_id: uuid.UUID, window_x: int, window_y: int, width: int, height: int) -> list[System]:
+    return list(db.scalars(viewport_query(galaxy_id, window_x, window_y, width, height)))
+
+
+def inbound_links(db: Session, system_id: uuid.UUID) -> list[uuid.UUID]:
+    """
+    Ids of systems with a hyperlink into system_id. Answered entirely from the
+    (destination, origin) index.
+    """
+    return list(db.scalars(select(hyperlink.c.origin).where(hyperlink.c.destination == system_id)))
@@ -0,0 +1,230 @@
+"""
+Streaming export/import of a whole galaxy.
+
+The archive is a zip of .npy members (so np.load opens it like an .npz). Every table
+is written in batches of columns, systems/00000/x.npy and so on, plus a manifest.json
+written last. Nullable columns carry a <column>.null mask. Export never holds more
+than one batch in memory, and import reads the archive one batch at a time and
+bulk inserts it with the secondary indexes dropped until the end.
+"""
+from dataclasses import dataclass
+from typing import Iterator
+import json
+import uuid
+import zipfile
+
+import numpy as np
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.orm import Session
+
+from starsight.models import Galaxy, Spob, System, hyperlink, raw_guid
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 50000
+MANIFEST = 'manifest.json'
+# negative means KiB, used while importing
+SQLITE_CACHE_SIZE = -262144
+
+
+@dataclass(frozen=True)
+class Field:
+    name: str
+    kind: str  # guid, int, float, str or enum
+    nullable: bool = False
+
+
+TABLES: dict[str, tuple[Field, ...]] = {
+    'systems': (
+        Field('id', 'guid'),
+        Field('name', 'str'),
+        Field('x', 'int'),
+        Field('y', 'int'),
+    ),
+    'spobs': (
+        Field('id', 'guid'),
+        Field('name', 'str', nullable=True),
+        Field('type', 'enum'),
+        Field('system_id', 'guid'),
+        Field('parent_id', 'guid', nullable=True),
+        Field('description', 'str', nullable=True),
+        Field('mass', 'float'),
+        Field('semi_major_axis', 'float'),
+        Field('eccentricity', 'float'),
+        Field('anomaly', 'float'),
+        Field('radius', 'float'),
+        Field('semi_minor_axis', 'float', nullable=True),
+        Field('roche_limit', 'float', nullable=True),
+        Field('hill_radius', 'float', nullable=True),
+        Field('period', 'float', nullable=True),
+    ),
+    'hyperlink': (
+        Field('origin', 'guid'),
+        Field('destination', 'guid'),
+    ),
+}
+
+_TABLE_OBJECTS = {
+    'systems': System.__table__,
+    'spobs': Spob.__table__,
+    'hyperlink': hyperlink,
+}
+
+_EMPTY_GUID = bytes(16)
+
+
+def _encode(field: Field, values: list) -> dict[str, np.ndarray]:
+    arrays = {}
+    if field.nullable:
+        null = np.array([v is None for v in values], dtype=bool)
+        arrays[f'{field.name}.null'] = null
+    if field.kind == 'guid':
+        data = b''.join(_EMPTY_GUID if v is None else v for v in values)
+        arrays[field.name] = np.frombuffer(data, dtype=np.uint8).reshape(-1, 16)
+    elif field.kind == 'int':
+        arrays[field.name] = np.array(values, dtype=np.int64)
+    elif field.kind == 'float':
+        arrays[field.name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    elif field.kind == 'enum':
+        arrays[field.name] = np.array([v.name for v in values], dtype=str)
+    else:
+        arrays[field.name] = np.array(['' if v is None else v for v in values], dtype=str)
+    return arrays
+
+
+def _decode(field: Field, archive, prefix: str) -> list:
+    """
+    Column values as the database stores them: GUIDs as 16 bytes, enums by name.
+    """
+    data = archive[f'{prefix}/{field.name}']
+    if field.kind == 'guid':
+        blob = data.tobytes()
+        values = [blob[i:i + 16] for i in range(0, len(blob), 16)]
+    else:
+        values = data.tolist()
+    if field.nullable:
+        nulls = archive[f'{prefix}/{field.name}.null'].tolist()
+        values = [None if null else v for v, null in zip(values, nulls)]
+    return values
+
+
+def _export_query(table: str, galaxy_id: uuid.UUID):
+    systems = System.__table__
+    if table == 'systems':
+        return select(
+            raw_guid(systems.c.id), systems.c.name, systems.c.x, systems.c.y,
+        ).where(systems.c.galaxy_id == galaxy_id)
+    if table == 'hyperlink':
+        return select(
+            raw_guid(hyperlink.c.origin), raw_guid(hyperlink.c.destination),
+        ).join(systems, systems.c.id == hyperlink.c.origin).where(systems.c.galaxy_id == galaxy_id)
+    spobs = Spob.__table__
+    columns = [
+        raw_guid(spobs.c[field.name]) if field.kind == 'guid' else spobs.c[field.name]
+        for field in TABLES['spobs']
+    ]
+    return select(*columns).join(systems, systems.c.id == spobs.c.system_id).where(systems.c.galaxy_id == galaxy_id)
+
+
+def _write_array(archive: zipfile.ZipFile, name: str, array: np.ndarray):
+    with archive.open(f'{name}.npy', 'w', force_zip64=True) as f:
+        np.lib.format.write_array(f, array, allow_pickle=False)
+
+
+def export_galaxy(conn, galaxy_id: uuid.UUID, path: str, batch_size: int = BATCH_SIZE, compress: bool = False) -> dict:
+    """
+    Write the galaxy and its systems, spobs and hyperlinks to path. conn can be a
+    Session or a Connection. Returns the manifest.
+    """
+    galaxy = conn.execute(select(Galaxy.__table__).where(Galaxy.__table__.c.id == galaxy_id)).one_or_none()
+    if galaxy is None:
+        raise ValueError(f'no galaxy {galaxy_id}')
+    manifest = {
+        'format': FORMAT_VERSION,
+        'galaxy': {'id': galaxy.id.hex, 'seed': galaxy.seed.hex, 'name': galaxy.name},
+        'tables': {},
+    }
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(path, 'w', compression=compression, allowZip64=True) as archive:
+        for table, fields in TABLES.items():
+            result = conn.execute(
+                _export_query(table, galaxy_id),
+                execution_options={'yield_per': batch_size},
+            )
+            batches = rows = 0
+            for partition in result.partitions():
+                columns = list(zip(*partition))
+                for field, values in zip(fields, columns):
+                    for name, array in _encode(field, list(values)).items():
+                        _write_array(archive, f'{table}/{batches:05d}/{name}', array)
+                batches += 1
+                rows += len(partition)
+            manifest['tables'][table] = {'batches': batches, 'rows': rows}
+        archive.writestr(MANIFEST, json.dumps(manifest, indent=2))
+    return manifest
+
+
+def read_manifest(path: str) -> dict:
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read(MANIFEST))
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f'unsupported galaxy archive format {manifest.get("format")!r}')
+    return manifest
+
+
+def _batches(archive, table: str, count: int) -> Iterator[dict[str, list]]:
+    for batch in range(count):
+        yield {field.name: _decode(field, archive, f'{table}/{batch:05d}') for field in TABLES[table]}
+
+
+def _bulk_insert(bind, table, columns: dict[str, list]):
+    """
+    executemany straight on the driver, the values are already in their stored form
+    so there is nothing for SQLAlchemy's per-row bind processing to do.
+    """
+    names = [column.name for column in table.primary_key] + [name for name in columns if name not in table.primary_key.c]
+    statement = insert(table).values({name: bindparam(name) for name in names})
+    compiled = statement.compile(dialect=bind.dialect)
+    if compiled.positional:
+        # sorted by primary key, so the key index is filled mostly in order
+        rows = sorted(zip(*(columns[name] for name in compiled.positiontup)))
+    else:
+        rows = [dict(zip(columns, row)) for row in zip(*columns.values())]
+    bind.exec_driver_sql(str(compiled), rows)
+
+
+def import_galaxy(conn, path: str, defer_indexes: bool = True) -> dict:
+    """
+    Load an archive written by export_galaxy. The galaxy must not already exist.
+    conn can be a Session or a Connection; the caller commits. Returns the manifest.
+    """
+    manifest = read_manifest(path)
+    info = manifest['galaxy']
+    galaxy_id = uuid.UUID(info['id'])
+    galaxies = Galaxy.__table__
+    if conn.execute(select(galaxies.c.id).where(galaxies.c.id == galaxy_id)).first() is not None:
+        raise ValueError(f'galaxy {galaxy_id} already exists')
+    conn.execute(insert(galaxies), [{'id': galaxy_id, 'seed': uuid.UUID(info['seed']), 'name': info['name']}])
+
+    indexes = [index for table in _TABLE_OBJECTS.values() for index in table.indexes] if defer_indexes else []
+    bind = conn.connection() if isinstance(conn, Session) else conn
+    sqlite = bind.dialect.name == 'sqlite'
+    if sqlite:
+        cache_size = bind.exec_driver_sql('PRAGMA cache_size').scalar()
+        bind.exec_driver_sql(f'PRAGMA cache_size = {SQLITE_CACHE_SIZE}')
+    for index in indexes:
+        index.drop(bind, checkfirst=True)
+
+    with np.load(path, allow_pickle=False) as archive:
+        for table in TABLES:
+            for columns in _batches(archive, table, manifest['tables'][table]['batches']):
+                if table == 'systems':
+                    columns['galaxy_id'] = [galaxy_id.bytes] * len(columns['id'])
+                _bulk_insert(bind, _TABLE_OBJECTS[table], columns)
+
+    for index in indexes:
+        index.create(bind, checkfirst=True)
+    if sqlite:
+        # refresh planner stats, the export queries rely on them to scan instead of seek
+        bind.exec_driver_sql('ANALYZE')
+        bind.exec_driver_sql(f'PRAGMA cache_size = {cache_size}')
+    return manifest
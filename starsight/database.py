@@ -1,13 +1,42 @@
+import os
+import threading
+from typing import Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
-DATABASE_URL = 'sqlite:///data/test.db'
+DATABASE_URL = os.environ.get('STARSIGHT_DATABASE_URL', 'sqlite:///data/test.db')
 
-engine = create_engine(DATABASE_URL, connect_args={'check_same_thread': False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# created on first use, so importing the models (or a worker that only serves
+# snapshotted chunks) never touches the database
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+_sessionmaker = sessionmaker(autocommit=False, autoflush=False)
+
+
+def get_engine() -> Engine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                connect_args = {'check_same_thread': False} if DATABASE_URL.startswith('sqlite') else {}
+                _engine = create_engine(DATABASE_URL, connect_args=connect_args)
+    return _engine
+
+
+def SessionLocal(**kwargs) -> Session:
+    return _sessionmaker(bind=get_engine(), **kwargs)
+
+
+def __getattr__(name: str):
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,55 @@
+from typing import Iterator, NamedTuple
+
+
+class GridIndex(NamedTuple):
+    """
+    Floor aligned cell of a square grid. Cell (i, j) covers
+    [i * size, (i + 1) * size) x [j * size, (j + 1) * size), so every cell is the same
+    width on both sides of the origin. Shared by hyperlink bucketing, chunk caching and
+    spatial queries so they all agree on where a cell starts.
+    """
+    x: int
+    y: int
+
+    @classmethod
+    def of(cls, x: float, y: float, size: int) -> 'GridIndex':
+        return cls(int(x // size), int(y // size))
+
+    def neighborhood(self) -> Iterator['GridIndex']:
+        """
+        This cell followed by its eight neighbors.
+        """
+        yield self
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if dx or dy:
+                    yield GridIndex(self.x + dx, self.y + dy)
+
+    def half_neighborhood(self) -> Iterator['GridIndex']:
+        """
+        The four neighbors that come after this cell. Visiting every cell with its half
+        neighborhood meets each pair of adjacent cells exactly once.
+        """
+        yield GridIndex(self.x + 1, self.y - 1)
+        yield GridIndex(self.x + 1, self.y)
+        yield GridIndex(self.x + 1, self.y + 1)
+        yield GridIndex(self.x, self.y + 1)
+
+    def bounds(self, size: int) -> tuple[int, int, int, int]:
+        """
+        (min_x, min_y, max_x, max_y), min inclusive and max exclusive.
+        """
+        return self.x * size, self.y * size, (self.x + 1) * size, (self.y + 1) * size
+
+
+def cells_in(window_x: int, window_y: int, width: int, height: int, size: int) -> list[GridIndex]:
+    """
+    Every cell that overlaps the window.
+    """
+    low = GridIndex.of(window_x, window_y, size)
+    high = GridIndex.of(window_x + width - 1, window_y + height - 1, size)
+    return [
+        GridIndex(x, y)
+        for x in range(low.x, high.x + 1)
+        for y in range(low.y, high.y + 1)
+    ]
@@ -0,0 +1,112 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Optional
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+
+_NULL_CONTEXT = nullcontext()
+
+
+class Metrics:
+    """
+    Per-stage timers and counters for a generation run. Stages are timed around whole
+    loops rather than per item, so the instrumented hot path is the same as the plain one.
+
+    profile: optionally capture a cProfile or tracemalloc report around capture().
+    on_report: called with the report dict every time report() is called, e.g. to
+    export to the API.
+    """
+    enabled = True
+
+    def __init__(self, profile: Optional[str] = None, on_report: Optional[Callable[[dict], None]] = None):
+        if profile is not None and profile not in PROFILE_MODES:
+            raise ValueError(f'unknown profile mode {profile!r}, expected one of {PROFILE_MODES}')
+        self.profile = profile
+        self.on_report = on_report
+        self.timers: dict[str, float] = defaultdict(float)
+        self.counters: dict[str, int] = defaultdict(int)
+        self.profile_report: Optional[str] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    @contextmanager
+    def capture(self, limit: int = 25):
+        if self.profile == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+                self.profile_report = out.getvalue()
+        elif self.profile == 'tracemalloc':
+            already_tracing = tracemalloc.is_tracing()
+            if not already_tracing:
+                tracemalloc.start()
+            try:
+                yield
+            finally:
+                snapshot = tracemalloc.take_snapshot()
+                if not already_tracing:
+                    tracemalloc.stop()
+                stats = snapshot.statistics('lineno')[:limit]
+                self.profile_report = '\n'.join(str(stat) for stat in stats)
+        else:
+            yield
+
+    def reset(self):
+        self.timers.clear()
+        self.counters.clear()
+        self.profile_report = None
+
+    def report(self) -> dict:
+        report = {
+            'timers': dict(self.timers),
+            'counters': dict(self.counters),
+        }
+        if self.profile_report is not None:
+            report['profile'] = self.profile_report
+        if self.on_report is not None:
+            self.on_report(report)
+        return report
+
+
+class NullMetrics(Metrics):
+    """
+    Disabled metrics. Every hook is a no-op.
+    """
+    enabled = False
+
+    def __init__(self):
+        super().__init__()
+
+    def stage(self, name: str):
+        return _NULL_CONTEXT
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+    def capture(self, limit: int = 25):
+        return _NULL_CONTEXT
+
+    def report(self) -> dict:
+        return {}
+
+
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,35 @@
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+
+from starsight.controllers import snapshot
+from starsight.controllers.scheduler import shutdown_scheduler
+from starsight.routers import scheduler, viewport
+
+
+def _load_snapshots():
+    for starfield in snapshot.load_starfields(snapshot.SNAPSHOT_DIR):
+        viewport.register_starfield(starfield)
+
+
+def _dump_snapshots():
+    for starfield in viewport.starfields():
+        snapshot.dump_starfield(starfield, snapshot.SNAPSHOT_DIR)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm chunk caches from the last shutdown, see starsight.controllers.snapshot
+    if snapshot.SNAPSHOT_DIR:
+        await run_in_threadpool(_load_snapshots)
+    yield
+    # let running chunks land in the caches before they are dumped
+    await run_in_threadpool(shutdown_scheduler)
+    if snapshot.SNAPSHOT_DIR:
+        await run_in_threadpool(_dump_snapshots)
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(viewport.router)
+app.include_router(scheduler.router)
@@ -1,32 +1,117 @@
-from sqlalchemy import Column, String, Enum, ForeignKey, Float, Integer, Table
+from sqlalchemy import Column, String, Enum, ForeignKey, Float, Index, Integer, Table, type_coerce
 from sqlalchemy.dialects.sqlite import BLOB as SQLITE_BLOB
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.types import TypeDecorator, BLOB
 from starsight.database import Base
-from functools import cached_property
+from starsight.grid import GridIndex
 from typing import Optional, List
 import enum
+import functools
 import math
 import uuid
 
 
+_new_object = object.__new__
+_set_attr = object.__setattr__
+_from_bytes = int.from_bytes
+_UNKNOWN_SAFE = uuid.SafeUUID.unknown
+
+INTERN_CACHE_SIZE = 4096
+
+
+def uuid_from_bytes(value: bytes) -> uuid.UUID:
+    """
+    Equivalent to uuid.UUID(bytes=value) without the argument validation, which is
+    most of the cost when loading a lot of rows.
+    """
+    u = _new_object(uuid.UUID)
+    _set_attr(u, 'int', _from_bytes(value, 'big'))
+    _set_attr(u, 'is_safe', _UNKNOWN_SAFE)
+    return u
+
+
+@functools.lru_cache(maxsize=INTERN_CACHE_SIZE)
+def _str_to_bytes(value: str) -> bytes:
+    return uuid.UUID(value).bytes
+
+
+def guid_bytes(value) -> Optional[bytes]:
+    if value is None:
+        return value
+    if isinstance(value, uuid.UUID):
+        return value.bytes
+    if isinstance(value, bytes):
+        return value
+    return _str_to_bytes(value)
+
+
 class GUID(TypeDecorator):
+    """
+    UUIDs stored as 16 byte blobs.
+
+    intern: share one uuid.UUID instance per distinct value on load. Meant for columns
+    like galaxy_id that repeat across every row of a result.
+    raw: skip UUID construction entirely and return the 16 byte key, for internal bulk
+    paths. See raw_guid().
+    """
     impl = BLOB
+    cache_ok = True
+
+    def __init__(self, intern: bool = False, raw: bool = False):
+        super().__init__()
+        self.intern = intern
+        self.raw = raw
 
     def load_dialect_impl(self, dialect):
         return dialect.type_descriptor(SQLITE_BLOB())
 
     def process_bind_param(self, value, dialect) -> Optional[bytes]:
-        if value is None:
-            return value
-        if not isinstance(value, uuid.UUID):
-            return uuid.UUID(value).bytes
-        return value.bytes
+        return guid_bytes(value)
 
     def process_result_value(self, value, dialect) -> Optional[uuid.UUID]:
-        if value is None:
+        if value is None or self.raw:
             return value
-        return uuid.UUID(bytes=value)
+        return uuid_from_bytes(value)
+
+    def bind_processor(self, dialect):
+        return guid_bytes
+
+    def literal_processor(self, dialect):
+        def process(value):
+            value = guid_bytes(value)
+            return 'NULL' if value is None else f"X'{value.hex()}'"
+        return process
+
+    def result_processor(self, dialect, coltype):
+        if self.raw:
+            return None
+        if not self.intern:
+            def process(value):
+                if value is None:
+                    return value
+                return uuid_from_bytes(value)
+            return process
+
+        interned = {}
+
+        def process(value):
+            if value is None:
+                return value
+            try:
+                return interned[value]
+            except KeyError:
+                if len(interned) >= INTERN_CACHE_SIZE:
+                    interned.clear()
+                u = interned[value] = uuid_from_bytes(value)
+                return u
+        return process
+
+
+def raw_guid(column):
+    """
+    Select a GUID column as raw 16 byte keys, e.g. select(raw_guid(System.id)).
+    """
+    return type_coerce(column, GUID(raw=True)).label(column.key)
 
 
 class Galaxy(Base):
@@ -46,18 +131,24 @@ hyperlink = Table(
     Base.metadata,
     Column('origin', ForeignKey('systems.id'), primary_key=True),
     Column('destination', ForeignKey('systems.id'), primary_key=True),
+    # covering index for reverse lookups, the primary key only serves origin first
+    Index('ix_hyperlink_destination_origin', 'destination', 'origin'),
 )
 
 
 class System(Base):
     __tablename__ = 'systems'
+    __table_args__ = (
+        # viewport queries: galaxy_id = ? AND x BETWEEN ? AND ? AND y BETWEEN ? AND ?
+        Index('ix_systems_galaxy_id_x_y', 'galaxy_id', 'x', 'y'),
+    )
 
     id = Column(GUID(), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
-    galaxy_id = Column(GUID(), ForeignKey('galaxies.id'), nullable=False, index=True)
+    galaxy_id = Column(GUID(intern=True), ForeignKey('galaxies.id'), nullable=False)
     name = Column(String, nullable=False)
     spobs = relationship('Spob', backref='system', remote_side=[id])
-    x: Mapped[int] = mapped_column(Integer, index=True)
-    y: Mapped[int] = mapped_column(Integer, index=True)
+    x: Mapped[int] = mapped_column(Integer)
+    y: Mapped[int] = mapped_column(Integer)
     hyperlinks: Mapped[List['System']] = relationship(
         'System',
         secondary=hyperlink,
@@ -68,8 +159,8 @@ class System(Base):
     def are_neighbors(self, other: 'System', distance: float) -> bool:
         return (distance * distance) > (((self.x - other.x) ** 2) + ((self.y - other.y) ** 2))
 
-    def bucket(self, chunk_size) -> tuple[int, int]:
-        return int(self.x / chunk_size), int(self.y / chunk_size)
+    def bucket(self, chunk_size) -> GridIndex:
+        return GridIndex.of(self.x, self.y, chunk_size)
 
 
 class SpobType(enum.Enum):
@@ -85,7 +176,7 @@ class Spob(Base):
     id: Mapped[GUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
     name: Mapped[str] = mapped_column(String, nullable=True)
     type = Column(Enum(SpobType, native_enum=False), nullable=False)
-    system_id = Column(GUID(), ForeignKey('systems.id'), nullable=False, index=True)
+    system_id = Column(GUID(intern=True), ForeignKey('systems.id'), nullable=False, index=True)
     parent_id: Mapped[GUID] = mapped_column(GUID(), ForeignKey('spobs.id'), nullable=True)
     children = relationship('Spob', backref='parent', remote_side=[id])
     description = Column(String, nullable=True)
@@ -95,28 +186,16 @@ class Spob(Base):
     anomaly: Mapped[float] = mapped_column(Float, default=0.0)
     radius: Mapped[float] = mapped_column(Float, default=1)
 
-    @cached_property
-    def semi_minor_axis(self) -> float:
-        return self.semi_major_axis * ((1.0 - (self.eccentricity**2))**0.5)
-
-    @cached_property
-    def roche_limit(self) -> float:
-        return self.radius * 1.26  # TODO constants
-
-    @cached_property
-    def hill_radius(self) -> float:
-        main_mass = 0.0
-        if self.parent_id:
-            main_mass = self.parent.mass
-        return self.semi_major * math.pow(self.mass / (3 * self.mass + main_mass), 1/3)
-
-    @cached_property
-    def period(self) -> float:
-        G = 6.6743e-11
-        return 2 * math.pi * math.sqrt(self.semi_major_axis ** 3 / (G * self.parent.mass))
+    # derived physics, filled in by starsight.controllers.derivation
+    semi_minor_axis: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    roche_limit: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    hill_radius: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    period: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
     def position(self, t: float) -> tuple[float, float]:
         tuning = 0.8
         period = self.period
+        if not period:
+            return self.semi_major_axis, 0.0
         theta = 2 * math.pi * ((t % period) / period) ** tuning
         return self.semi_major_axis * math.cos(theta), self.semi_minor_axis * math.sin(theta)
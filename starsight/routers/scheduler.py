@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+
+from starsight.controllers.scheduler import get_scheduler
+
+router = APIRouter()
+
+
+@router.get('/scheduler/stats')
+def scheduler_stats() -> dict:
+    """
+    Queue depth, dedup and drop counts, and p50/p95/max of recent queue wait and
+    generation times in seconds.
+    """
+    return get_scheduler().stats()
@@ -0,0 +1,246 @@
+"""
+Live viewport subscriptions.
+
+A client connects to /ws/galaxies/{galaxy_id}/viewport and sends a message every time
+its viewport moves:
+
+    {"type": "viewport", "x": -500, "y": -500, "width": 1000, "height": 1000}
+
+The server replies with one {"type": "chunk", ...} message per Starfield chunk that has
+become visible and that the client has not been sent yet, nearest to the viewport
+center first. Work for chunks that scroll out of view before they were generated is
+dropped. A client that evicts chunks from its own cache can ask for them again later
+with
+
+    {"type": "forget", "chunks": [[x, y], ...]}
+
+Viewports larger than MAX_VIEWPORT_SIDE chunks a side are clamped around their center.
+A malformed message closes the connection with 1003.
+
+Chunks are generated by the background ChunkScheduler, the visible ones first and
+then a ring around the viewport as prefetch. Sends are awaited one at a time, so a slow
+client holds back its own connection instead of piling up messages in memory.
+"""
+from concurrent.futures import Future
+from typing import Optional
+import asyncio
+import json
+import math
+import uuid
+
+import anyio
+
+from fastapi import APIRouter, WebSocket
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+from starsight.controllers.generation import Chunk, Starfield
+from starsight.controllers.scheduler import ChunkScheduler, get_scheduler
+from starsight.database import SessionLocal
+from starsight.grid import GridIndex
+from starsight.models import Galaxy
+
+MAX_VIEWPORT_CHUNKS = 64
+MAX_VIEWPORT_SIDE = math.isqrt(MAX_VIEWPORT_CHUNKS)
+MAX_FORGET_CHUNKS = 1024
+# keeps generation windows well inside int32 noise and numpy arithmetic
+MAX_COORDINATE = 2 ** 30
+
+router = APIRouter()
+
+_starfields: dict[uuid.UUID, Starfield] = {}
+
+
+def register_starfield(starfield: Starfield):
+    _starfields[starfield.galaxy.id] = starfield
+
+
+def starfields() -> list[Starfield]:
+    return list(_starfields.values())
+
+
+def get_starfield(galaxy_id: uuid.UUID) -> Optional[Starfield]:
+    starfield = _starfields.get(galaxy_id)
+    if starfield is not None:
+        return starfield
+    db = SessionLocal()
+    try:
+        galaxy = db.get(Galaxy, galaxy_id)
+        if galaxy is None:
+            return None
+        db.expunge(galaxy)
+    finally:
+        db.close()
+    return _starfields.setdefault(galaxy_id, Starfield(galaxy))
+
+
+def _integer(value, name: str, low: int = -MAX_COORDINATE, high: int = MAX_COORDINATE) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f'{name} must be a number')
+    value = int(value)
+    if not low <= value <= high:
+        raise ValueError(f'{name} must be between {low} and {high}')
+    return value
+
+
+class Viewport:
+    """
+    Latest viewport of one connection. Every update bumps the version so in-progress
+    work can tell it is stale.
+
+    max_size: width and height above this are clamped around the viewport center.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.version = 0
+        self.window: Optional[tuple[int, int, int, int]] = None
+        self.forgotten: set[GridIndex] = set()
+        self.changed = asyncio.Event()
+
+    def update(self, message):
+        """
+        Raises ValueError for a malformed message, leaving the viewport unchanged.
+        """
+        if not isinstance(message, dict):
+            raise ValueError('expected a JSON object')
+        kind = message.get('type', 'viewport')
+        if kind == 'forget':
+            chunks = message.get('chunks')
+            if not isinstance(chunks, list) or len(chunks) > MAX_FORGET_CHUNKS:
+                raise ValueError(f'chunks must be a list of at most {MAX_FORGET_CHUNKS} [x, y] pairs')
+            forgotten = []
+            for chunk in chunks:
+                if not isinstance(chunk, list) or len(chunk) != 2:
+                    raise ValueError('chunks must be [x, y] pairs')
+                forgotten.append(GridIndex(_integer(chunk[0], 'chunk x'), _integer(chunk[1], 'chunk y')))
+            self.forgotten.update(forgotten)
+        elif kind == 'viewport':
+            x = _integer(message.get('x'), 'x')
+            y = _integer(message.get('y'), 'y')
+            width = _integer(message.get('width'), 'width', 0)
+            height = _integer(message.get('height'), 'height', 0)
+            if width > self.max_size:
+                x += (width - self.max_size) // 2
+                width = self.max_size
+            if height > self.max_size:
+                y += (height - self.max_size) // 2
+                height = self.max_size
+            self.window = (x, y, width, height)
+        else:
+            raise ValueError(f'unknown message type {kind!r}')
+        self.version += 1
+        self.changed.set()
+
+
+def _wanted(starfield: Starfield, window: tuple[int, int, int, int], sent: set[GridIndex]) -> list[GridIndex]:
+    """
+    Visible chunks nearest the center first. The window is already clamped, so this is
+    at most (MAX_VIEWPORT_SIDE + 1) ** 2 cells before the cut.
+    """
+    x, y, width, height = window
+    size = starfield.chunk_size
+    center_x = (x + width / 2) / size - 0.5
+    center_y = (y + height / 2) / size - 0.5
+    visible = sorted(
+        starfield.chunks_in(x, y, width, height),
+        key=lambda index: (index.x - center_x) ** 2 + (index.y - center_y) ** 2,
+    )
+    return [index for index in visible[:MAX_VIEWPORT_CHUNKS] if index not in sent]
+
+
+async def _receive(websocket: WebSocket, viewport: Viewport, cancel_scope: anyio.CancelScope):
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            try:
+                if message.get('text') is None:
+                    raise ValueError('expected a text message')
+                viewport.update(json.loads(message['text']))
+            except ValueError as e:
+                # close reasons are limited to 123 bytes
+                await websocket.close(code=1003, reason=str(e)[:120])
+                return
+    finally:
+        # stops the push side too, including any chunk it is waiting on
+        cancel_scope.cancel()
+
+
+async def _result(future: Future) -> Optional[Chunk]:
+    """
+    Wait for a scheduler future, None if it was cancelled. Cancelling the waiting task
+    leaves the future alone, other connections may share it.
+    """
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+
+    def resolve(done: Future):
+        if waiter.done():
+            return
+        if done.cancelled():
+            waiter.set_result(None)
+        elif done.exception() is not None:
+            waiter.set_exception(done.exception())
+        else:
+            waiter.set_result(done.result())
+
+    def callback(done: Future):
+        try:
+            loop.call_soon_threadsafe(resolve, done)
+        except RuntimeError:
+            # loop already closed, nobody is waiting any more
+            pass
+
+    future.add_done_callback(callback)
+    return await waiter
+
+
+async def _push(websocket: WebSocket, starfield: Starfield, viewport: Viewport, scheduler: ChunkScheduler):
+    sent: set[GridIndex] = set()
+    while True:
+        await viewport.changed.wait()
+        viewport.changed.clear()
+        sent -= viewport.forgotten
+        viewport.forgotten.clear()
+        if viewport.window is None:
+            continue
+        version = viewport.version
+        window = viewport.window
+        wanted = _wanted(starfield, window, sent)
+        # replaces this connection's previous request, queued chunks that are no
+        # longer wanted get cancelled. Off the loop, snapshot chunks are decoded here.
+        futures = await run_in_threadpool(scheduler.request, starfield, wanted, owner=viewport)
+        await run_in_threadpool(scheduler.prefetch, starfield, window)
+        for index, future in zip(wanted, futures):
+            if viewport.version != version:
+                # moved on, changed is set again so the loop recomputes what is visible
+                break
+            chunk = future.result() if future.done() and not future.cancelled() else await _result(future)
+            if chunk is None or viewport.version != version:
+                # cancelled, or stays cached and is sent next pass if still visible
+                break
+            await websocket.send_json({'type': 'chunk', **chunk.to_json()})
+            sent.add(index)
+
+
+@router.websocket('/ws/galaxies/{galaxy_id}/viewport')
+async def viewport_subscription(websocket: WebSocket, galaxy_id: uuid.UUID):
+    try:
+        starfield = await run_in_threadpool(get_starfield, galaxy_id)
+    except SQLAlchemyError:
+        await websocket.close(code=1011, reason='galaxy lookup failed')
+        return
+    if starfield is None:
+        await websocket.close(code=4404, reason='unknown galaxy')
+        return
+    await websocket.accept()
+    viewport = Viewport(MAX_VIEWPORT_SIDE * starfield.chunk_size)
+    scheduler = get_scheduler()
+    try:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(_receive, websocket, viewport, tg.cancel_scope)
+            tg.start_soon(_push, websocket, starfield, viewport, scheduler)
+    finally:
+        scheduler.release(viewport)
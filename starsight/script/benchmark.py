@@ -0,0 +1,353 @@
+"""
+Reproducible benchmarks for generation, linking, persistence and queries.
+
+    python -m starsight.script.benchmark --output bench.json
+    python -m starsight.script.benchmark --output new.json --compare bench.json
+
+Everything runs offline against an in-memory SQLite database. Results are written as
+JSON so runs from different commits can be compared.
+"""
+from contextlib import contextmanager
+from typing import Callable, Optional
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+import uuid
+
+import noise
+import numpy as np
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import Session
+
+from starsight.controllers.generation import _OCTAVES, GENERATION_PARAMS, generate_star_field, system_designation
+from starsight.controllers.simplex import NOISE_BACKENDS, NoiseBackend, get_noise_backend
+from starsight.controllers.spatial import viewport_query
+from starsight.database import Base
+from starsight.instrumentation import Metrics
+from starsight.models import Galaxy, Spob, SpobType, System, raw_guid
+
+GALAXY_SEED = uuid.UUID("fc35429a-dd41-42d7-8559-20b0e6cb6500")
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), 'simplex_golden.json')
+
+WINDOW_SIZES = (500, 1000, 2000)
+STAR_THRESHOLDS = (0.6, 0.7, 0.8)
+QUICK_WINDOW_SIZES = (500,)
+QUICK_STAR_THRESHOLDS = (0.7,)
+TABLE_ROWS = 20000
+QUICK_TABLE_ROWS = 2000
+
+
+def _galaxy() -> Galaxy:
+    return Galaxy(id=GALAXY_SEED, seed=GALAXY_SEED, name='benchmark')
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def _params(**overrides):
+    old = {k: GENERATION_PARAMS[k] for k in overrides}
+    GENERATION_PARAMS.update(overrides)
+    try:
+        yield
+    finally:
+        GENERATION_PARAMS.update(old)
+
+
+def _time(fn: Callable[[], object], repeat: int, number: int = 1) -> dict:
+    fn()  # warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        'repeat': repeat,
+        'number': number,
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+    }
+
+
+def _engine_with_systems(rows: int):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    rng = random.Random(0)
+    galaxy = _galaxy()
+    with engine.begin() as conn:
+        conn.execute(insert(Galaxy.__table__), [{'id': galaxy.id, 'seed': galaxy.seed, 'name': galaxy.name}])
+        conn.execute(insert(System.__table__), [
+            {
+                'id': uuid.UUID(int=rng.getrandbits(128)),
+                'galaxy_id': galaxy.id,
+                'name': 'benchmark',
+                'x': rng.randrange(-50000, 50000),
+                'y': rng.randrange(-50000, 50000),
+            }
+            for _ in range(rows)
+        ])
+    return engine, galaxy
+
+
+def bench_generation(sizes, thresholds, repeat: int) -> list[dict]:
+    results = []
+    galaxy = _galaxy()
+    for size in sizes:
+        for threshold in thresholds:
+            with _params(star_threshold=threshold):
+                metrics = Metrics()
+                timing = _time(lambda: generate_star_field(galaxy, -size // 2, -size // 2, size, size, metrics), repeat)
+            runs = repeat + 1
+            results.append({
+                'name': 'generate_star_field',
+                'params': {'size': size, 'star_threshold': threshold},
+                **timing,
+                'stages': {k: v / runs for k, v in metrics.timers.items()},
+                'counters': {k: v // runs for k, v in metrics.counters.items()},
+            })
+    return results
+
+
+def bench_hyperlinks(sizes, repeat: int) -> list[dict]:
+    results = []
+    galaxy = _galaxy()
+    for size in sizes:
+        def links():
+            metrics = Metrics()
+            generate_star_field(galaxy, -size // 2, -size // 2, size, size, metrics)
+            return metrics.timers['links']
+        links()
+        samples = [links() for _ in range(repeat)]
+        results.append({
+            'name': 'hyperlink_pass',
+            'params': {'size': size},
+            'repeat': repeat,
+            'number': 1,
+            'min': min(samples),
+            'median': statistics.median(samples),
+            'mean': statistics.fmean(samples),
+        })
+    return results
+
+
+def reference_links(galaxy: Galaxy, systems: list[System]) -> set[tuple[uuid.UUID, uuid.UUID]]:
+    """
+    Undirected hyperlinks from testing every pair, no grid involved.
+    """
+    links = set()
+    base = galaxy.snoise_base
+    for i, s1 in enumerate(systems):
+        for s2 in systems[i + 1:]:
+            if not s1.are_neighbors(s2, GENERATION_PARAMS['max_jump_dist']):
+                continue
+            value = (noise.snoise3((s1.x + s2.x) / 2, (s1.y + s2.y) / 2, base, octaves=_OCTAVES) + 1.0) / 2.0
+            if value >= GENERATION_PARAMS['jump_threshold']:
+                links.add(tuple(sorted((s1.id, s2.id))))
+    return links
+
+
+def bench_grid(repeat: int) -> list[dict]:
+    """
+    Windows straddling the origin, where the grid used to alias. Checks the grid link
+    pass against the all-pairs reference and records how many pairs it had to test.
+    """
+    results = []
+    galaxy = _galaxy()
+    for window in ((-500, -500, 1000, 1000), (-1000, -250, 1500, 500)):
+        metrics = Metrics()
+        systems = generate_star_field(galaxy, *window, metrics)
+        links = {tuple(sorted((s1.id, s2.id))) for s1 in systems for s2 in s1.hyperlinks}
+        timing = _time(lambda: generate_star_field(galaxy, *window), repeat)
+        results.append({
+            'name': 'grid_links',
+            'params': dict(zip(('x', 'y', 'width', 'height'), window)),
+            **timing,
+            'pairs_tested': metrics.counters['pairs_tested'],
+            'links': len(links),
+            'links_match': links == reference_links(galaxy, systems),
+        })
+    return results
+
+
+def check_noise_golden(backend: NoiseBackend) -> float:
+    """
+    Largest difference between the backend and the noise.snoise3 golden values.
+    """
+    with open(GOLDEN_PATH) as f:
+        points = json.load(f)['points']
+    worst = 0.0
+    for octaves in sorted({p[3] for p in points}):
+        for z in sorted({p[2] for p in points}):
+            group = [p for p in points if p[2] == z and p[3] == octaves]
+            values = backend.snoise3_array(np.array([p[0] for p in group]), np.array([p[1] for p in group]), z, octaves)
+            worst = max(worst, float(np.abs(values - np.array([p[4] for p in group])).max()))
+    return worst
+
+
+def bench_noise(sizes, repeat: int) -> list[dict]:
+    results = []
+    base = _galaxy().snoise_base
+    for name in sorted(NOISE_BACKENDS):
+        backend = get_noise_backend(name)
+        error = check_noise_golden(backend)
+        for size in sizes:
+            step = GENERATION_PARAMS['galaxy_cell_size']
+            xs, ys = np.meshgrid(np.arange(-size // 2, size // 2, step), np.arange(-size // 2, size // 2, step), indexing='ij')
+            timing = _time(lambda: backend.snoise3_array(xs, ys, base, _OCTAVES), repeat)
+            results.append({
+                'name': 'noise_grid',
+                'params': {'backend': name, 'size': size},
+                **timing,
+                'points_per_sec': xs.size / timing['median'],
+                'golden_max_error': error,
+            })
+    return results
+
+
+def bench_designation(repeat: int) -> list[dict]:
+    guids = [str(uuid.uuid5(GALAXY_SEED, str(i))) for i in range(1000)]
+    timing = _time(lambda: [system_designation(g) for g in guids], repeat)
+    return [{'name': 'system_designation', 'params': {'count': len(guids)}, **timing}]
+
+
+def bench_position(repeat: int) -> list[dict]:
+    spob = Spob(
+        type=SpobType.PLANET,
+        mass=6e24,
+        semi_major_axis=1.5e11,
+        eccentricity=0.1,
+        radius=6371,
+        semi_minor_axis=1.5e11 * (1 - 0.1 ** 2) ** 0.5,
+        period=3.15e7,
+    )
+    ts = [t * 3600.0 for t in range(1000)]
+    timing = _time(lambda: [spob.position(t) for t in ts], repeat)
+    return [{'name': 'spob_position', 'params': {'count': len(ts)}, **timing}]
+
+
+def bench_guid(rows: int, repeat: int) -> list[dict]:
+    engine, galaxy = _engine_with_systems(rows)
+    table = System.__table__
+    results = []
+
+    def load():
+        with engine.connect() as conn:
+            return conn.execute(select(table.c.id, table.c.galaxy_id)).all()
+    timing = _time(load, repeat)
+    results.append({'name': 'guid_select', 'params': {'rows': rows}, **timing, 'rows_per_sec': rows / timing['median']})
+
+    def load_raw():
+        with engine.connect() as conn:
+            return conn.execute(select(raw_guid(table.c.id), raw_guid(table.c.galaxy_id))).all()
+    timing = _time(load_raw, repeat)
+    results.append({'name': 'guid_select_raw', 'params': {'rows': rows}, **timing, 'rows_per_sec': rows / timing['median']})
+
+    ids = [{'id': str(uuid.uuid4()), 'galaxy_id': str(galaxy.id), 'name': 'b', 'x': 0, 'y': 0} for _ in range(rows)]
+
+    def store():
+        with engine.connect() as conn:
+            conn.execute(insert(table), ids)
+            conn.rollback()
+    timing = _time(store, repeat)
+    results.append({'name': 'guid_insert_str', 'params': {'rows': rows}, **timing, 'rows_per_sec': rows / timing['median']})
+    return results
+
+
+def bench_viewport(rows: int, repeat: int) -> list[dict]:
+    engine, galaxy = _engine_with_systems(rows)
+    results = []
+    for size in (1000, 10000):
+        query = viewport_query(galaxy.id, -size // 2, -size // 2, size, size)
+        with engine.connect() as conn:
+            plan = [row[-1] for row in conn.execute(explain_query_plan(query, engine))]
+
+        def load():
+            with Session(engine) as session:
+                return session.scalars(query).all()
+        found = len(load())
+        timing = _time(load, repeat)
+        results.append({
+            'name': 'viewport_query',
+            'params': {'rows': rows, 'size': size, 'found': found},
+            **timing,
+            'plan': plan,
+        })
+    return results
+
+
+def explain_query_plan(query, engine):
+    compiled = query.compile(engine, compile_kwargs={'literal_binds': True})
+    return text(f'EXPLAIN QUERY PLAN {compiled}')
+
+
+def run(quick: bool = False, repeat: int = 5) -> dict:
+    sizes = QUICK_WINDOW_SIZES if quick else WINDOW_SIZES
+    thresholds = QUICK_STAR_THRESHOLDS if quick else STAR_THRESHOLDS
+    rows = QUICK_TABLE_ROWS if quick else TABLE_ROWS
+    results = []
+    results.extend(bench_generation(sizes, thresholds, repeat))
+    results.extend(bench_hyperlinks(sizes, repeat))
+    results.extend(bench_noise(sizes, repeat))
+    results.extend(bench_grid(repeat))
+    results.extend(bench_designation(repeat))
+    results.extend(bench_position(repeat))
+    results.extend(bench_guid(rows, repeat))
+    results.extend(bench_viewport(rows, repeat))
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def _key(result: dict) -> str:
+    params = ','.join(f'{k}={v}' for k, v in sorted(result['params'].items()) if k != 'found')
+    return f"{result['name']}[{params}]"
+
+
+def compare(old: dict, new: dict):
+    before = {_key(r): r for r in old['results']}
+    for result in new['results']:
+        key = _key(result)
+        if key not in before:
+            print(f'{key:70} {result["median"] * 1000:10.3f}ms (new)')
+            continue
+        ratio = result['median'] / before[key]['median']
+        print(f'{key:70} {result["median"] * 1000:10.3f}ms {ratio:6.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='bench.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='previous results JSON to compare against')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--quick', action='store_true', help='small sizes only')
+    args = parser.parse_args()
+
+    results = run(quick=args.quick, repeat=args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    else:
+        for result in results['results']:
+            print(f'{_key(result):70} {result["median"] * 1000:10.3f}ms')
+
+
+if __name__ == '__main__':
+    main()
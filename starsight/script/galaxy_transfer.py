@@ -0,0 +1,41 @@
+"""
+Move a generated galaxy between databases.
+
+    python -m starsight.script.galaxy_transfer export <galaxy id> galaxy.npz
+    python -m starsight.script.galaxy_transfer import galaxy.npz
+"""
+import argparse
+import time
+import uuid
+
+from starsight.controllers.transfer import export_galaxy, import_galaxy
+from starsight.database import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export')
+    export.add_argument('galaxy_id', type=uuid.UUID)
+    export.add_argument('path')
+    export.add_argument('--compress', action='store_true')
+    load = commands.add_parser('import')
+    load.add_argument('path')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        if args.command == 'export':
+            manifest = export_galaxy(db, args.galaxy_id, args.path, compress=args.compress)
+        else:
+            manifest = import_galaxy(db, args.path)
+            db.commit()
+    finally:
+        db.close()
+    rows = ', '.join(f'{table} {info["rows"]}' for table, info in manifest['tables'].items())
+    print(f'{args.command}ed {manifest["galaxy"]["id"]} ({rows}) in {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
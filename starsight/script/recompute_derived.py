@@ -0,0 +1,16 @@
+from starsight.controllers.derivation import recompute_derived
+from starsight.database import SessionLocal
+
+
+def main():
+    db = SessionLocal()
+    try:
+        count = recompute_derived(db)
+        db.commit()
+    finally:
+        db.close()
+    print(f'recomputed {count} spobs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+In-process load test for the viewport WebSocket.
+
+    python -m starsight.script.viewport_load_test --clients 8 --pans 20
+
+Each client pans across the galaxy and waits until every chunk of its viewport has
+arrived. With --flick, clients send a burst of intermediate viewports before settling,
+which exercises dropping stale chunk work. No server or database is needed.
+
+With --snapshot DIR the app loads and dumps chunk snapshots there, run it twice to
+compare a cold start with a warm one.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import statistics
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+
+from starsight.controllers import snapshot
+from starsight.controllers.generation import Starfield
+from starsight.grid import GridIndex
+from starsight.main import app
+from starsight.models import Galaxy
+from starsight.routers.viewport import register_starfield
+
+GALAXY_SEED = uuid.UUID("fc35429a-dd41-42d7-8559-20b0e6cb6500")
+
+
+def _client(client: TestClient, starfield: Starfield, n: int, pans: int, step: int, size: int, flick: int) -> dict:
+    latencies = []
+    received: set[GridIndex] = set()
+    duplicates = 0
+    x = y = n * 10 * size  # spread clients out so they don't just share a cache
+    with client.websocket_connect(f'/ws/galaxies/{starfield.galaxy.id}/viewport') as ws:
+        for _ in range(pans):
+            for i in range(flick):
+                ws.send_json({'type': 'viewport', 'x': x + i * step // flick, 'y': y, 'width': size, 'height': size})
+            x += step
+            window = {'type': 'viewport', 'x': x, 'y': y, 'width': size, 'height': size}
+            start = time.perf_counter()
+            ws.send_json(window)
+            wanted = set(starfield.chunks_in(x, y, size, size))
+            while not wanted <= received:
+                message = ws.receive_json()
+                index = GridIndex(*message['chunk'])
+                if index in received:
+                    duplicates += 1
+                received.add(index)
+            latencies.append(time.perf_counter() - start)
+    return {'latencies': latencies, 'chunks': len(received), 'duplicates': duplicates}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--pans', type=int, default=10)
+    parser.add_argument('--step', type=int, default=250)
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--flick', type=int, default=0, help='intermediate viewports sent before each pan')
+    parser.add_argument('--snapshot', help='chunk snapshot directory, off by default')
+    args = parser.parse_args()
+
+    snapshot.SNAPSHOT_DIR = args.snapshot
+    starfield = Starfield(Galaxy(id=GALAXY_SEED, seed=GALAXY_SEED, name='load test'))
+    # replaced by the snapshot one on startup if there is a snapshot for it
+    register_starfield(starfield)
+    start = time.perf_counter()
+    with TestClient(app) as client, ThreadPoolExecutor(args.clients) as pool:
+        results = list(pool.map(
+            lambda n: _client(client, starfield, n, args.pans, args.step, args.size, args.flick),
+            range(args.clients),
+        ))
+        elapsed = time.perf_counter() - start
+        stats = client.get('/scheduler/stats').json()
+
+    latencies = sorted(l for r in results for l in r['latencies'])
+    chunks = sum(r['chunks'] for r in results)
+    print(f'{args.clients} clients, {len(latencies)} pans, {chunks} chunks in {elapsed:.2f}s')
+    print(f'pan latency median {statistics.median(latencies) * 1000:.1f}ms, '
+          f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms, max {latencies[-1] * 1000:.1f}ms')
+    print(f'duplicate chunks {sum(r["duplicates"] for r in results)}')
+    print(f'scheduler: {stats["completed"]} generated, {stats["deduplicated"]} deduplicated, '
+          f'{stats["dropped"]} prefetch dropped, queue wait p95 {(stats["wait_seconds"]["p95"] or 0) * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
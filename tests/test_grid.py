@@ -0,0 +1,63 @@
+import uuid
+
+import pytest
+
+from starsight.controllers.generation import GENERATION_PARAMS, generate_star_field
+from starsight.grid import GridIndex, cells_in
+from starsight.models import Galaxy
+from starsight.script.benchmark import reference_links
+
+GALAXY_SEED = uuid.UUID("fc35429a-dd41-42d7-8559-20b0e6cb6500")
+
+
+@pytest.mark.parametrize('x, y, size, expected', [
+    (0, 0, 100, (0, 0)),
+    (99, 99, 100, (0, 0)),
+    (-1, -1, 100, (-1, -1)),
+    (-100, -100, 100, (-1, -1)),
+    (-101, 100, 100, (-2, 1)),
+    (-0.5, 250.5, 100, (-1, 2)),
+])
+def test_grid_index_of_floors(x, y, size, expected):
+    assert GridIndex.of(x, y, size) == GridIndex(*expected)
+
+
+def test_cells_are_the_same_width_across_the_origin():
+    for i in range(-3, 3):
+        min_x, min_y, max_x, max_y = GridIndex(i, i).bounds(100)
+        assert (max_x - min_x, max_y - min_y) == (100, 100)
+        assert GridIndex.of(min_x, min_y, 100) == GridIndex(i, i)
+        assert GridIndex.of(max_x - 1, max_y - 1, 100) == GridIndex(i, i)
+
+
+def test_half_neighborhood_covers_each_adjacent_pair_once():
+    cells = cells_in(-300, -300, 600, 600, 100)
+    inside = set(cells)
+    pairs = [frozenset((cell, neighbor)) for cell in cells for neighbor in cell.half_neighborhood()]
+    assert len(pairs) == len(set(pairs))
+    adjacent = {
+        frozenset((cell, neighbor))
+        for cell in cells
+        for neighbor in cell.neighborhood()
+        if neighbor != cell and neighbor in inside
+    }
+    assert adjacent <= set(pairs)
+
+
+@pytest.mark.parametrize('window', [
+    (-500, -500, 1000, 1000),
+    (-1000, -250, 1500, 500),
+    (-150, -50, 300, 100),
+])
+def test_grid_links_match_all_pairs_reference(window):
+    galaxy = Galaxy(id=GALAXY_SEED, seed=GALAXY_SEED, name='test')
+    systems = generate_star_field(galaxy, *window)
+    links = {tuple(sorted((s1.id, s2.id))) for s1 in systems for s2 in s1.hyperlinks}
+    assert links
+    assert all(s1 != s2 for s1, s2 in links)
+    assert links == reference_links(galaxy, systems)
+    assert all(
+        s1.are_neighbors(s2, GENERATION_PARAMS['max_jump_dist'])
+        for s1 in systems
+        for s2 in s1.hyperlinks
+    )
@@ -0,0 +1,109 @@
+from concurrent.futures import wait
+import threading
+import time
+import uuid
+
+import pytest
+
+from starsight.controllers.generation import Chunk, Starfield
+from starsight.controllers.scheduler import ChunkScheduler, ring
+from starsight.grid import GridIndex
+from starsight.models import Galaxy
+
+GALAXY_SEED = uuid.UUID("fc35429a-dd41-42d7-8559-20b0e6cb6500")
+
+
+class SlowStarfield(Starfield):
+    """
+    Records generated chunks instead of generating them. Workers block until release
+    is set so tests can inspect the queue.
+    """
+
+    def __init__(self):
+        super().__init__(Galaxy(id=GALAXY_SEED, seed=GALAXY_SEED, name='test'))
+        self.generated: list[GridIndex] = []
+        self.release = threading.Event()
+        self._generated_lock = threading.Lock()
+
+    def generate_chunk(self, index, metrics=None) -> Chunk:
+        self.release.wait()
+        with self._generated_lock:
+            self.generated.append(index)
+        return Chunk(index=index, systems=[], links=[])
+
+
+@pytest.fixture
+def starfield():
+    starfield = SlowStarfield()
+    yield starfield
+    starfield.release.set()
+
+
+@pytest.fixture
+def scheduler(starfield):
+    scheduler = ChunkScheduler(workers=2, prefetch_workers=1, max_visible=16, max_prefetch=8)
+    yield scheduler
+    starfield.release.set()
+    scheduler.shutdown()
+
+
+def _row(y: int, n: int) -> list[GridIndex]:
+    return [GridIndex(x, y) for x in range(n)]
+
+
+def test_concurrent_requests_share_one_computation(starfield, scheduler):
+    first = scheduler.request(starfield, _row(0, 4), owner='a')
+    second = scheduler.request(starfield, _row(0, 4), owner='b')
+    assert [f is g for f, g in zip(first, second)] == [True] * 4
+    starfield.release.set()
+    wait(first)
+    assert sorted(starfield.generated) == _row(0, 4)
+    assert scheduler.request(starfield, _row(0, 4))[0].result().index == GridIndex(0, 0)
+
+
+def test_new_request_cancels_stale_visible_jobs(starfield, scheduler):
+    stale = scheduler.request(starfield, _row(0, 10), owner='a')
+    time.sleep(0.05)
+    current = scheduler.request(starfield, _row(1, 10), owner='a')
+    # two were already running, the rest of the old viewport is cancelled
+    assert sum(f.cancelled() for f in stale) == 8
+    assert scheduler.stats()['queued_visible'] == 10
+    starfield.release.set()
+    wait(current)
+    assert sorted(starfield.generated) == sorted(_row(0, 2) + _row(1, 10))
+
+
+def test_shared_jobs_survive_one_owner_moving_on(starfield, scheduler):
+    scheduler.request(starfield, _row(0, 10), owner='a')
+    shared = scheduler.request(starfield, _row(0, 10), owner='b')
+    scheduler.request(starfield, _row(1, 4), owner='a')
+    assert not any(f.cancelled() for f in shared)
+
+
+def test_release_cancels_everything_queued_for_the_owner(starfield, scheduler):
+    futures = scheduler.request(starfield, _row(0, 10), owner='a')
+    time.sleep(0.05)
+    scheduler.release('a')
+    assert sum(f.cancelled() for f in futures) == 8
+    stats = scheduler.stats()
+    assert stats['queued'] == 0 and stats['owners'] == 0 and stats['cancelled'] == 8
+
+
+def test_visible_depth_is_capped_per_owner(starfield, scheduler):
+    with pytest.raises(ValueError):
+        scheduler.request(starfield, _row(0, 17), owner='a')
+
+
+def test_prefetch_is_capped(starfield, scheduler):
+    futures = scheduler.prefetch(starfield, (0, 0, 2000, 2000), width=2)
+    assert len(futures) == 8
+    assert scheduler.stats()['queued_prefetch'] <= 8
+
+
+def test_ring_is_the_band_around_the_window(starfield):
+    cells = ring(starfield, (0, 0, 1000, 1000), width=1, limit=100)
+    visible = set(starfield.chunks_in(0, 0, 1000, 1000))
+    around = set(starfield.chunks_in(-500, -500, 2000, 2000))
+    assert set(cells) == around - visible
+    # a huge window costs its perimeter, not its area
+    assert len(ring(starfield, (0, 0, 10 ** 9, 10 ** 9), limit=10)) == 10
@@ -0,0 +1,35 @@
+import json
+
+import numpy as np
+import pytest
+
+from starsight.controllers.simplex import NOISE_BACKENDS, get_noise_backend
+from starsight.script.benchmark import GOLDEN_PATH, check_noise_golden
+
+# the golden values are float32 results stored as float64
+TOLERANCE = 1e-6
+
+
+@pytest.fixture(scope='module')
+def golden() -> list:
+    with open(GOLDEN_PATH) as f:
+        return json.load(f)['points']
+
+
+@pytest.mark.parametrize('name', sorted(NOISE_BACKENDS))
+def test_array_matches_golden(name):
+    assert check_noise_golden(get_noise_backend(name)) <= TOLERANCE
+
+
+@pytest.mark.parametrize('name', sorted(NOISE_BACKENDS))
+def test_scalar_matches_golden(name, golden):
+    backend = get_noise_backend(name)
+    for x, y, z, octaves, expected in golden:
+        assert backend.snoise3(x, y, z, octaves) == pytest.approx(expected, abs=TOLERANCE)
+
+
+def test_backends_agree_on_a_generation_grid():
+    grid_x, grid_y = np.meshgrid(np.arange(-1000, 1000, 20), np.arange(-1000, 1000, 20), indexing='ij')
+    values = [get_noise_backend(name).snoise3_array(grid_x, grid_y, 0xFFFFF, 4) for name in sorted(NOISE_BACKENDS)]
+    for other in values[1:]:
+        np.testing.assert_allclose(other, values[0], rtol=0, atol=TOLERANCE)
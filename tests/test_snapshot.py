@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+import uuid
+
+from starsight.controllers.generation import Starfield
+from starsight.controllers.snapshot import dump_starfield, load_starfield
+from starsight.grid import GridIndex
+from starsight.models import Galaxy
+
+GALAXY_SEED = uuid.UUID("fc35429a-dd41-42d7-8559-20b0e6cb6500")
+
+
+def _starfield() -> Starfield:
+    return Starfield(Galaxy(id=GALAXY_SEED, seed=GALAXY_SEED, name='test'))
+
+
+def _worker(directory: str, indexes: list[tuple[int, int]]) -> int:
+    starfield = load_starfield(directory, GALAXY_SEED) or _starfield()
+    for index in indexes:
+        starfield.chunk(GridIndex(*index))
+    return dump_starfield(starfield, directory)
+
+
+def test_round_trip(tmp_path):
+    starfield = _starfield()
+    indexes = [GridIndex(0, 0), GridIndex(-1, 2)]
+    for index in indexes:
+        starfield.chunk(index)
+    assert dump_starfield(starfield, tmp_path) == 2
+
+    loaded = load_starfield(tmp_path, GALAXY_SEED)
+    assert loaded is not None
+    for index in indexes:
+        assert loaded.cached(index).to_json() == starfield.cached(index).to_json()
+
+
+def test_workers_sharing_a_directory_keep_each_others_chunks(tmp_path):
+    _worker(str(tmp_path), [(0, 0)])
+    # both start from the same snapshot, then dump one after the other
+    first = load_starfield(tmp_path, GALAXY_SEED)
+    second = load_starfield(tmp_path, GALAXY_SEED)
+    first.chunk(GridIndex(1, 0))
+    second.chunk(GridIndex(2, 0))
+    dump_starfield(first, tmp_path)
+    dump_starfield(second, tmp_path)
+
+    merged = load_starfield(tmp_path, GALAXY_SEED)
+    assert set(merged.snapshot.indexes()) == {GridIndex(0, 0), GridIndex(1, 0), GridIndex(2, 0)}
+    assert len(list(tmp_path.glob('*.npy'))) == 3
+
+
+def test_concurrent_dumps_leave_one_snapshot(tmp_path):
+    jobs = [[(i, 0)] for i in range(4)]
+    with ProcessPoolExecutor(4) as pool:
+        list(pool.map(_worker, [str(tmp_path)] * len(jobs), jobs))
+    merged = load_starfield(tmp_path, GALAXY_SEED)
+    assert set(merged.snapshot.indexes()) == {GridIndex(i, 0) for i in range(4)}
+    assert len(list(tmp_path.glob('*.npy'))) == 3
+    assert not list(tmp_path.glob('*.json.*'))
@@ -0,0 +1,83 @@
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from starsight.controllers.generation import Starfield
+from starsight.main import app
+from starsight.models import Galaxy
+from starsight.routers.viewport import MAX_VIEWPORT_SIDE, Viewport, register_starfield
+
+GALAXY_SEED = uuid.UUID("fc35429a-dd41-42d7-8559-20b0e6cb6500")
+
+
+@pytest.fixture(scope='module')
+def starfield() -> Starfield:
+    starfield = Starfield(Galaxy(id=GALAXY_SEED, seed=GALAXY_SEED, name='test'))
+    register_starfield(starfield)
+    return starfield
+
+
+@pytest.fixture
+def client() -> TestClient:
+    return TestClient(app)
+
+
+@pytest.mark.parametrize('message', [
+    {'type': 'viewport', 'x': 0},
+    {'type': 'viewport', 'x': 0, 'y': 0, 'width': -1, 'height': 10},
+    {'type': 'viewport', 'x': 'a', 'y': 0, 'width': 10, 'height': 10},
+    {'type': 'viewport', 'x': 1e300, 'y': 0, 'width': 10, 'height': 10},
+    {'type': 'forget', 'chunks': [[0]]},
+    {'type': 'forget', 'chunks': 'nope'},
+    {'type': 'zoom'},
+    [1, 2],
+])
+def test_malformed_message_closes_with_1003(starfield, client, message):
+    with client.websocket_connect(f'/ws/galaxies/{starfield.galaxy.id}/viewport') as ws:
+        ws.send_json(message)
+        with pytest.raises(WebSocketDisconnect) as e:
+            ws.receive_json()
+    assert e.value.code == 1003
+
+
+def test_non_json_closes_with_1003(starfield, client):
+    with client.websocket_connect(f'/ws/galaxies/{starfield.galaxy.id}/viewport') as ws:
+        ws.send_text('{not json')
+        with pytest.raises(WebSocketDisconnect) as e:
+            ws.receive_json()
+    assert e.value.code == 1003
+
+
+def test_huge_viewport_is_clamped(starfield, client):
+    viewport = Viewport(MAX_VIEWPORT_SIDE * starfield.chunk_size)
+    viewport.update({'type': 'viewport', 'x': -200000, 'y': -200000, 'width': 400000, 'height': 400000})
+    side = MAX_VIEWPORT_SIDE * starfield.chunk_size
+    assert viewport.window == (-side // 2, -side // 2, side, side)
+
+    start = time.perf_counter()
+    with client.websocket_connect(f'/ws/galaxies/{starfield.galaxy.id}/viewport') as ws:
+        ws.send_json({'type': 'viewport', 'x': -1000, 'y': -1000, 'width': 10 ** 9, 'height': 10 ** 9})
+        message = ws.receive_json()
+    assert message['type'] == 'chunk'
+    assert time.perf_counter() - start < 10
+
+
+def test_chunks_have_no_self_links(starfield, client):
+    with client.websocket_connect(f'/ws/galaxies/{starfield.galaxy.id}/viewport') as ws:
+        ws.send_json({'type': 'viewport', 'x': 0, 'y': 0, 'width': 500, 'height': 500})
+        message = ws.receive_json()
+    assert message['chunk'] == [0, 0]
+    assert message['links']
+    assert all(origin != destination for origin, destination in message['links'])
+
+
+def test_unknown_galaxy_without_database_closes(client, monkeypatch):
+    monkeypatch.setattr('starsight.database.DATABASE_URL', 'sqlite:////nonexistent/dir/test.db')
+    monkeypatch.setattr('starsight.database._engine', None)
+    with pytest.raises(WebSocketDisconnect) as e:
+        with client.websocket_connect(f'/ws/galaxies/{uuid.uuid4()}/viewport') as ws:
+            ws.receive_json()
+    assert e.value.code == 1011